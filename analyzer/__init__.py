@@ -1 +1,9 @@
-from analyzer.finance_analyzer import Analyzer
+# Классы пакета загружаются при первом обращении
+from lazy_import import lazy_getattr
+
+_modules = {
+    'Analyzer': 'analyzer.finance_analyzer'
+}
+__all__ = list(_modules)
+
+__getattr__ = lazy_getattr(__name__, _modules)
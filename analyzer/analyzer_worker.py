@@ -0,0 +1,48 @@
+# Точка входа процесса анализатора. Процесс по расписанию формирует рейтинг,
+# обновляет портфель и публикует результаты в базе, откуда их читает бот
+
+from datetime import date, datetime
+
+from apscheduler.schedulers.blocking import BlockingScheduler
+
+from analyzer import Analyzer
+from analyzer.pipeline import RankingPipeline
+from storage import DatabaseManager
+
+if __name__ == '__main__':
+    database_manager = DatabaseManager()
+    database_manager.create_all()
+    analyzer = Analyzer()
+
+    # первая публикация, чтобы бот мог отвечать сразу после запуска.
+    # Она датируется днём рейтинга из архива, а не сегодняшним
+    if database_manager.get_latest_publication() is None:
+        latest = analyzer.ranking_archive.latest()
+        database_manager.publish_ranking(
+            latest[0] if latest is not None else date.today(),
+            analyzer.best_companies, analyzer.best_companies)
+
+    def update_recommendations(day=None):
+        prev_best = analyzer.best_companies
+        cur_best = analyzer.get_best_companies(day)
+        database_manager.publish_ranking(day or date.today(), cur_best,
+                                         prev_best)
+
+    # продолжение запуска за последний будний день, прерванного
+    # перезапуском процесса, и запуск, пропущенный из-за того, что процесс
+    # не работал в 21:00
+    now = datetime.now()
+    unfinished = RankingPipeline.find_unfinished(
+        analyzer.cloud_manager, RankingPipeline.last_weekday(now.date()))
+    if unfinished is not None:
+        print(f'Продолжение формирования рейтинга за {unfinished}')
+        update_recommendations(unfinished)
+    elif now.weekday() <= 4 and now.hour >= 21 and \
+            database_manager.get_latest_publication()['ranking_date'] \
+            < now.date():
+        update_recommendations()
+
+    scheduler = BlockingScheduler()
+    scheduler.add_job(update_recommendations, 'cron',
+                      day_of_week='mon-fri', hour=21, minute=0)
+    scheduler.start()
@@ -1,103 +1,113 @@
 # Класс, отвечающий за анализ показателей компаний и формирование рейтинга акций
 
 import os
-import time
 from datetime import datetime, timedelta
 
 import numpy as np
 import pandas as pd
-import requests
-from bs4 import BeautifulSoup
-from tqdm import tqdm
 
+import settings
+from analyzer.finviz_crawler import FinvizCrawler
+from analyzer.http_client import HttpClient
+from analyzer.pipeline import RankingPipeline
+from analyzer.ranking_state import RankingState
+from analyzer.yahoo_fetcher import YahooFetcher
 from assets import Portfolio
-from storage import CloudManager, DatabaseManager
+from storage import CloudManager, DatabaseManager, RankingArchive
 
 
 class Analyzer:
     def __init__(self):
         self.database_manager = DatabaseManager()
         self.cloud_manager = CloudManager()
-        self._portfolio_name = 'portfolio_v1.json'
+        # finviz и yahoo ходят через один клиент с общим кэшем ответов
+        self.http_client = HttpClient()
+        self.finviz_crawler = FinvizCrawler(http_client=self.http_client)
+        self.yahoo_fetcher = YahooFetcher(http_client=self.http_client)
+        self._portfolio_name = settings.PORTFOLIO_FILENAME
         self.portfolio = Portfolio(self._portfolio_name)
 
-        self.yahoo_columns = ['Rating', 'Low Target', 'Current Price',
-                              'Average Target', 'High Target']
-
-        # получение последней таблицы с данными
-        last_date = datetime.today()
-        filename = self._get_ranking_filename(last_date)
-        while not self.cloud_manager.download_from_cloud(filename):
-            last_date -= timedelta(1)
-            filename = self._get_ranking_filename(last_date)
-        self.last_ranking = pd.read_csv(filename, index_col=0)
+        self.yahoo_columns = YahooFetcher.columns
+
+        # при инкрементальном обновлении заново загружаются только
+        # устаревшие показатели, время загрузки хранится в RankingState
+        self.ranking_state = None
+        if settings.INCREMENTAL_RANKING:
+            self.ranking_state = RankingState(self.cloud_manager)
+
+        # получение последней таблицы с данными из локального архива,
+        # предварительно дополненного недостающими рейтингами из облака
+        self.ranking_archive = RankingArchive(cloud_manager=self.cloud_manager)
+        self.ranking_archive.sync()
+        latest = self.ranking_archive.latest()
+        if latest is None:
+            raise RuntimeError('В архиве и в облаке нет ни одного рейтинга')
+        self.last_ranking = latest[1]
         self.best_companies = self._selection_function(self.last_ranking)
-        os.remove(filename)
-
-    @staticmethod
-    def _get_ranking_filename(date):
-        return 'ordered_ranks_' + date.strftime('%Y_%m_%d') + '.csv'
 
-    @staticmethod
-    def _get_ranks_dict(order_filter, table_type, param):
+    def _get_ranks_dict(self, order_filter, table_type, param):
         """
         Формирование рейтинга компаний по финансовому показателю (order_filter).
-        Последовательный "просмотр" страниц сайта finviz.com при помощи BeautifulSoup
+        Параллельный "просмотр" страниц сайта finviz.com при помощи FinvizCrawler
         """
-        start_url = 'https://finviz.com/screener.ashx?v=1' + str(
-            table_type) + '1&o={}&r='.format(order_filter)
-        ranks = dict()
-        params = dict()
-
         print('Загрузка показателей c finviz:')
-        for i in tqdm(range(1, 8573, 20)):
-            url = start_url + str(i)
-            headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; '
-                                     'Win64; x64) AppleWebKit/537.36 '
-                                     '(KHTML, like Gecko) '
-                                     'Chrome/92.0.4515.131 '
-                                     'Safari/537.36 OPR/78.0.4093.147'}
-
-            for attempt in range(4):
-                page = requests.get(url, headers=headers)
-                soup = BeautifulSoup(page.text, 'lxml')
-                try:
-                    tbl = soup.find('table', class_='table-light')
-                    rows = tbl.findAll('tr', valign='top')
-                    for row in rows:
-                        tds = row.findAll('td')
-                        ranks[tds[1].text] = int(tds[0].text)
-                        string_value = tds[param].text.strip('%')
-                        if string_value == '-':
-                            string_value = 'NaN'
-                        params[tds[1].text] = float(string_value)
-                    break
-                except:
-                    if attempt == 3:
-                        print(f'Ошибка на стороне finviz: {page.text}')
-                    else:
-                        time.sleep((attempt + 1) * 15)
-
-        return ranks, params
-
-    def _get_new_ranking(self):
+        return self.finviz_crawler.crawl(order_filter, table_type, param)
+
+    @staticmethod
+    def _get_white_list():
         """
-        Формирование рейтинга компаний по финансовым показателям P/E и ROE
+        Тикеры акций, доступных для покупки
         """
         white_list = pd.read_excel(
             os.path.join('resources', 'white_list.xlsx'))
-        tickers = white_list['Торговый код'].to_list()
+        return white_list['Торговый код'].to_list()
 
-        pe_ranks, pe = self._get_ranks_dict('pe', 1, 7)
+    def _get_pe_ranks(self):
+        """
+        Ранжирование компаний по показателю P/E. В инкрементальном режиме
+        за тот же проход по скринеру забираются и текущие цены акций
+        """
+        params = {'pe': 7}
+        if self.ranking_state is not None:
+            params['price'] = 8
+        print('Загрузка показателей c finviz:')
+        ranks, columns = self.finviz_crawler.crawl_columns('pe', 1, params)
+        frame = pd.DataFrame({
+            'E/P rang': pd.Series(ranks, dtype=float),
+            'E/P (%)': 100 / pd.Series(columns['pe'], dtype=float)})
+        if 'price' in columns:
+            frame['Current Price'] = pd.Series(columns['price'], dtype=float)
+        return frame
+
+    def _get_roe_ranks(self):
+        """
+        Ранжирование компаний по показателю ROE
+        """
         roe_ranks, roe = self._get_ranks_dict('-roe', 6, 5)
+        return pd.DataFrame({'ROE rang': pd.Series(roe_ranks, dtype=float),
+                             'ROE (%)': pd.Series(roe, dtype=float)})
 
-        ep_rang_series = pd.Series(pe_ranks, name='E/P rang')
-        ep_series = (100 / pd.Series(pe, name='E/P (%)'))
-        roe_rang_series = pd.Series(roe_ranks, name='ROE rang')
-        roe_series = pd.Series(roe, name='ROE (%)')
+    def _need_roe_ranks(self, now):
+        """
+        Нужен ли сегодня проход по скринеру за показателем ROE. Без
+        инкрементального режима рейтинг всегда собирается заново
+        """
+        if self.ranking_state is None:
+            return True
+        return self.ranking_state.stale_fundamentals(
+            self._get_white_list(), now).any()
+
+    def _get_new_ranking(self, pe_ranks, roe_ranks):
+        """
+        Формирование рейтинга компаний по финансовым показателям P/E и ROE.
+        В инкрементальном режиме roe_ranks может быть None: тогда значения
+        ROE остаются из предыдущего рейтинга
+        """
+        tickers = self._get_white_list()
+        if self.ranking_state is not None:
+            return self._get_incremental_ranking(pe_ranks, roe_ranks, tickers)
 
-        series = [ep_rang_series, ep_series, roe_rang_series, roe_series]
-        ranks = pd.concat(series, axis=1, sort=False)
+        ranks = pd.concat([pe_ranks, roe_ranks], axis=1, sort=False)
         ranks['Summary rang'] = ranks['E/P rang'] + ranks['ROE rang']
 
         need_tickers_ranks = ranks.loc[ranks.index.intersection(tickers)]
@@ -108,100 +118,138 @@ class Analyzer:
         return need_tickers_ranks.sort_values('Summary rang')
 
     @staticmethod
-    def _get_quote_estimation(ticker):
-        """
-        Получение текущей цены и прогнозов на цену акции, а также значения "привлекательности"
-        этой акции для покупки по версии yahoo
-        """
-        ticker = ticker.replace('@', '.')
-        url = r'https://query1.finance.yahoo.com/v10/finance/quoteSummary/{0}?modules=financialData'.format(
-            ticker)
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; '
-                                 'Win64; x64) AppleWebKit/537.36 '
-                                 '(KHTML, like Gecko) '
-                                 'Chrome/92.0.4515.131 '
-                                 'Safari/537.36 OPR/78.0.4093.147'}
-
-        response = requests.get(url, headers=headers)
-        data = response.json()['quoteSummary']['result'][0]['financialData']
-        rating = data['recommendationMean']['raw']
-        low = data['targetLowPrice']['raw']
-        current = data['currentPrice']['raw']
-        average = data['targetMeanPrice']['raw']
-        high = data['targetHighPrice']['raw']
-
-        return [rating, low, current, average, high]
-
-    def _get_estimation(self, tickers):
-        """
-        Получение текущих цен и прогнозов на цены акций для заданных тикеров
-        """
-        estimation = pd.DataFrame(index=tickers, columns=self.yahoo_columns)
-        print('Загрузка данных с yahoo:')
-        for ticker in tqdm(tickers):
-            for i in range(5):
-                try:
-                    estimation.loc[ticker] = self._get_quote_estimation(ticker)
-                    break
-                except Exception:
-                    pass
-        return estimation
+    def _update_ranking(ranking, update):
+        """
+        Замена значений в ranking значениями из update (кроме NaN). Новые
+        тикеры и столбцы добавляются в конец таблицы. В отличие от
+        combine_first, обновляются только нужные ячейки одного массива
+        """
+        index = ranking.index.append(
+            update.index.difference(ranking.index))
+        columns = ranking.columns.append(
+            update.columns.difference(ranking.columns))
+        values = ranking.reindex(index=index, columns=columns).to_numpy(
+            dtype=float, copy=True)
+
+        cells = np.ix_(index.get_indexer(update.index),
+                       columns.get_indexer(update.columns))
+        new_values = update.to_numpy(dtype=float)
+        values[cells] = np.where(np.isnan(new_values), values[cells],
+                                 new_values)
+        return pd.DataFrame(values, index=index, columns=columns)
+
+    def _get_incremental_ranking(self, pe_ranks, roe_ranks, tickers):
+        """
+        Инкрементальное обновление предыдущего рейтинга свежими ценами, P/E
+        и (если загружались) ROE
+        """
+        update = pe_ranks
+        if roe_ranks is not None:
+            update = update.join(roe_ranks, how='outer')
+        update = update.loc[update.index.intersection(tickers)]
+        ranking = self._update_ranking(self.last_ranking, update)
+        ranking['Summary rang'] = ranking['E/P rang'] + ranking['ROE rang']
+        return ranking.sort_values('Summary rang')
+
+    def _get_estimation_tickers(self, ranking, now):
+        """
+        Тикеры, для которых нужно загрузить прогнозы аналитиков. В
+        инкрементальном режиме это только тикеры с устаревшими прогнозами
+        """
+        tickers = ranking.index.to_list()
+        if self.ranking_state is None:
+            return tickers
+        stale = self.ranking_state.stale_targets(tickers, now)
+        print(f'Устаревших прогнозов: {len(stale)} из {len(tickers)}')
+        return stale
+
+    def _get_estimation(self, tickers, budget=None):
+        """
+        Получение текущих цен и прогнозов на цены акций для заданных тикеров.
+        В инкрементальном режиме к прогнозам добавляются дата отчётности
+        и отметка об отсутствии данных у yahoo
+        """
+        incremental = self.ranking_state is not None
+        return self.yahoo_fetcher.fetch(tickers, earnings=incremental,
+                                        budget=budget, empty=incremental)
+
+    def _apply_estimation(self, ranking, estimation):
+        """
+        Добавление прогнозов аналитиков в рейтинг. В инкрементальном режиме
+        текущая цена уже есть из finviz, а прогнозы обновляются только
+        по успешно загруженным тикерам
+        """
+        if self.ranking_state is None:
+            return ranking.join(estimation)
+        estimation = estimation[estimation['Rating'].notna()]
+        targets = estimation[[column for column in self.yahoo_columns
+                              if column != 'Current Price']]
+        return self._update_ranking(ranking, targets)
+
+    def _update_ranking_state(self, pe_ranks, roe_ranks, estimation, now):
+        """
+        Отметка о том, какие показатели были загружены в момент now
+        """
+        state = self.ranking_state
+        if state is None:
+            return
+        tickers = self._get_white_list()
+        state.mark_prices(pe_ranks.index.intersection(tickers), now)
+        if roe_ranks is not None:
+            state.mark_fundamentals(tickers, now)
+        empty = estimation[self.yahoo_fetcher.empty_column] == 1
+        state.mark_empty_targets(estimation.index[empty], now)
+        estimation = estimation[estimation['Rating'].notna()]
+        state.mark_targets(
+            estimation[self.yahoo_fetcher.earnings_column], now)
+        state.save()
 
     def _save_info_to_database(self, ranking):
         """
         Сохранение информации об акциях в базу
         """
-        print('Загрузка данных в базу:')
-        for ticker, row in tqdm(ranking.iterrows()):
-            self.database_manager \
-                .insert_update_share_info(ticker, row['E/P (%)'],
-                                          row['ROE (%)'], row['Current Price'],
-                                          row['Rating'], row['Low Target'],
-                                          row['Average Target'],
-                                          row['High Target'])
+        print('Загрузка данных в базу')
+        self.database_manager.bulk_upsert_share_info(ranking)
 
-    def _get_ranking(self):
+    def _get_ranking(self, day=None):
         """
         Формирование рейтинга компаний по финансовым показателям P/E и ROE
-        и сохранение его в базу
+        и сохранение его в базу. Если задан day, продолжается запуск за этот
+        день (см. RankingPipeline.find_unfinished)
         """
+        if day is not None:
+            return RankingPipeline(self, day).run()
+
         recent_date = datetime.today()
         weekday = recent_date.weekday()
         recent_date -= timedelta((weekday > 4) + (weekday > 5))
-        filename = self._get_ranking_filename(recent_date)
 
-        # формирование таблицы происходит только по будням
+        # формирование таблицы происходит только по будням. Каждый этап
+        # сохраняет результат в облако, так что после падения задача
+        # продолжается с последнего завершённого этапа
         if datetime.today().weekday() <= 4:
-            # ранжирование акций по показателям P/E и ROE
-            ranking = self._get_new_ranking()
-            tickers = ranking.index.to_list()
-
-            # получение прогнозов на акции по версии аналитиков
-            estimation = self._get_estimation(tickers)
-            ranking = pd.concat([ranking, estimation], axis=1)
-            ranking.to_csv(filename)
-
-            # сохранение информации в базу
-            self._save_info_to_database(ranking)
-
-            # загрузка таблицы в облако
-            self.cloud_manager.upload_to_cloud(filename)
-        else:
-            self.cloud_manager.download_from_cloud(filename)
-            ranking = pd.read_csv(filename, index_col=0)
-        os.remove(filename)
+            return RankingPipeline(self, recent_date.date()).run()
 
-        return ranking
+        self.ranking_archive.sync()
+        latest = self.ranking_archive.latest(recent_date.date())
+        if latest is None:
+            # в архиве нет рейтинга за пятницу и ранее - формируем его
+            print('В архиве нет рейтинга, формируем новый')
+            return RankingPipeline(self, recent_date.date()).run()
+        return latest[1]
 
     @staticmethod
-    def _selection_function(ranking, companies_number=5):
+    def _selection_function(ranking, companies_number=5,
+                            prefilter_multiplier=6,
+                            sort_by=('Rating', 'Summary rang')):
         """
-        Функция отбора недооценённых акций
+        Функция отбора недооценённых акций. Та же логика на массивах
+        используется при тестировании стратегии на истории (см. backtest)
         """
         return ranking[
             ranking['Current Price'] < ranking['Average Target']].head(
-            companies_number * 6).dropna().sort_values(
-            by=['Rating', 'Summary rang']).head(companies_number)
+            companies_number * prefilter_multiplier).dropna().sort_values(
+            by=list(sort_by)).head(companies_number)
 
     def update_portfolio(self):
         """
@@ -233,13 +281,14 @@ class Analyzer:
         self.portfolio.update_history()
         self.portfolio.save(self._portfolio_name)
 
-    def get_best_companies(self):
+    def get_best_companies(self, day=None):
         """
         Определение лучших для покупки акций по версии анализатора.
         Возвращает два значения: первое - лучшие companies_number акций,
-        второе - изменился ли их список по сравнению с предыдущим
+        второе - изменился ли их список по сравнению с предыдущим.
+        day - день незавершённого запуска, который нужно продолжить
         """
-        ranking = self._get_ranking()
+        ranking = self._get_ranking(day)
         self.best_companies = self._selection_function(ranking)
         self.last_ranking = ranking
 
@@ -0,0 +1,144 @@
+# Класс для параллельной загрузки страниц скринера finviz.com
+
+import heapq
+import random
+import time
+import typing as tp
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+
+import numpy as np
+from tqdm import tqdm
+
+from analyzer.finviz_parser import FinvizParser
+from analyzer.http_client import HttpClient
+from rate_limiter import RateLimiter
+
+
+class FinvizCrawler:
+    base_url = 'https://finviz.com/screener.ashx'
+
+    def __init__(self, max_workers: int = 8, min_interval: float = 0.2,
+                 attempts: int = 4, backoff: float = 5.0,
+                 http_client: tp.Optional[HttpClient] = None,
+                 parse_workers: int = 2):
+        self.max_workers = max_workers
+        self.attempts = attempts
+        self.backoff = backoff
+        # разбор страниц идёт в отдельном пуле, пока другие страницы
+        # загружаются (lxml отпускает GIL на время разбора)
+        self.parse_workers = parse_workers
+        self.parser = FinvizParser()
+
+        # общий для всех потоков клиент с пулом соединений и кэшем ответов
+        if http_client is None:
+            http_client = HttpClient()
+        self.http_client = http_client
+
+        # ограничение частоты запросов общее для всех обходов скринера
+        self.rate_limiter = RateLimiter(min_interval)
+
+    @staticmethod
+    def _is_valid_page(response) -> bool:
+        """
+        В кэш попадают только страницы с таблицей скринера, а не страницы
+        ошибки или проверки на робота, отданные с кодом 200
+        """
+        return b'table-light' in response.content
+
+    def _retry_delay(self, attempt: int) -> float:
+        """
+        Задержка перед попыткой номер attempt со случайной составляющей
+        """
+        delay = attempt * self.backoff
+        return delay + random.uniform(0, delay)
+
+    def _fetch_page(self, url: str) -> str:
+        """
+        Загрузка одной страницы скринера
+        """
+        page = self.http_client.get(url, rate_limiter=self.rate_limiter,
+                                    key=urlparse(url).netloc,
+                                    validate=self._is_valid_page)
+        page.raise_for_status()
+        return page.text
+
+    def crawl(self, order_filter: str, table_type: int, param: int) \
+            -> tp.Tuple[tp.Dict[str, int], tp.Dict[str, float]]:
+        """
+        Формирование рейтинга компаний по финансовому показателю (order_filter).
+        Страницы скринера загружаются параллельно
+        """
+        ranks, columns = self.crawl_columns(order_filter, table_type,
+                                            {'value': param})
+        return ranks, columns['value']
+
+    def crawl_columns(self, order_filter: str, table_type: int,
+                      params: tp.Dict[str, int]) \
+            -> tp.Tuple[tp.Dict[str, int], tp.Dict[str, tp.Dict[str, float]]]:
+        """
+        То же, что и crawl, но за один проход по скринеру забирает сразу
+        несколько столбцов таблицы (params: название -> номер столбца)
+        """
+        start_url = self.base_url + '?v=1' + str(
+            table_type) + '1&o={}&r='.format(order_filter)
+        urls = [start_url + str(i) for i in range(1, 8573, 20)]
+        names = list(params)
+        indices = [params[name] for name in names]
+
+        pages = [([], np.empty(0), np.empty((0, len(names)))) for _ in urls]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as fetcher, \
+                ThreadPoolExecutor(max_workers=self.parse_workers) as parser, \
+                tqdm(total=len(urls)) as progress:
+            # загруженная страница сразу отправляется на разбор, а при
+            # ошибке загрузки или разбора - в очередь повторных загрузок.
+            # Повтор ставится в пул только по истечении задержки, так что
+            # потоки загрузки не простаивают в ожидании
+            pending = {fetcher.submit(self._fetch_page, url): (i, 0, False)
+                       for i, url in enumerate(urls)}
+            retries = []
+            while pending or retries:
+                now = time.monotonic()
+                while retries and retries[0][0] <= now:
+                    _, i, attempt = heapq.heappop(retries)
+                    retry = fetcher.submit(self._fetch_page, urls[i])
+                    pending[retry] = (i, attempt, False)
+                timeout = retries[0][0] - now if retries else None
+                if not pending:
+                    time.sleep(timeout)
+                    continue
+                done, _ = wait(pending, timeout=timeout,
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    i, attempt, parsed = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as error:
+                        # страница с ошибкой не должна остаться в кэше
+                        self.http_client.invalidate(urls[i])
+                        if attempt + 1 < self.attempts:
+                            heapq.heappush(retries, (
+                                time.monotonic()
+                                + self._retry_delay(attempt + 1),
+                                i, attempt + 1))
+                        else:
+                            print(f'Ошибка на стороне finviz: {error}')
+                            progress.update()
+                        continue
+
+                    if parsed:
+                        pages[i] = result
+                        progress.update()
+                    else:
+                        parsing = parser.submit(self.parser.parse, result,
+                                                indices)
+                        pending[parsing] = (i, attempt, True)
+
+        # объединяем страницы в исходном порядке
+        ranks = dict()
+        columns = {name: dict() for name in names}
+        for tickers, page_ranks, values in pages:
+            ranks.update(zip(tickers, page_ranks.tolist()))
+            for j, name in enumerate(names):
+                columns[name].update(zip(tickers, values[:, j].tolist()))
+        return ranks, columns
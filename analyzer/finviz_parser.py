@@ -0,0 +1,55 @@
+# Разбор страниц скринера finviz.com. Вместо полного дерева BeautifulSoup
+# используется lxml и XPath только по строкам таблицы, а числовые столбцы
+# переводятся в числа целиком средствами numpy
+
+import typing as tp
+
+import lxml.html
+import numpy as np
+
+
+class FinvizParser:
+    table_xpath = ('//table[contains(concat(" ", normalize-space(@class), '
+                   '" "), " table-light ")]')
+    rows_xpath = './/tr[@valign="top"]'
+
+    @staticmethod
+    def _to_float(strings: tp.List[str]) -> np.ndarray:
+        """
+        Перевод строк вида '12.5%', '1,234.56' или '-' (нет значения)
+        в массив чисел
+        """
+        if not len(strings):
+            return np.empty(0)
+        values = np.char.replace(np.char.strip(np.array(strings, dtype=str),
+                                               '%'), ',', '')
+        # np.where расширяет тип строк: при присваивании в массив <U1
+        # (например, столбец из одних '-') 'nan' обрезалось бы до 'n'
+        values = np.where((values == '-') | (values == ''), 'nan', values)
+        return values.astype(float)
+
+    def parse(self, html: tp.Union[str, bytes], params: tp.Sequence[int]) \
+            -> tp.Tuple[tp.List[str], np.ndarray, np.ndarray]:
+        """
+        Тикеры, их места в рейтинге и значения столбцов с номерами params
+        (массив размера строки x params). Если таблицы скринера на странице
+        нет (например, finviz вернул страницу с ошибкой), бросает ValueError
+        """
+        tree = lxml.html.fromstring(html)
+        tables = tree.xpath(self.table_xpath)
+        if not tables:
+            raise ValueError('На странице нет таблицы скринера')
+
+        tickers, ranks = [], []
+        cells = [[] for _ in params]
+        for row in tables[0].xpath(self.rows_xpath):
+            tds = row.findall('td')
+            ranks.append(tds[0].text_content())
+            tickers.append(tds[1].text_content())
+            for column, param in zip(cells, params):
+                column.append(tds[param].text_content())
+
+        values = np.empty((len(tickers), len(params)))
+        for j, column in enumerate(cells):
+            values[:, j] = self._to_float(column)
+        return tickers, np.array(ranks, dtype=np.int64), values
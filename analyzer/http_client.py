@@ -0,0 +1,241 @@
+# HTTP-клиент анализатора: общий пул keep-alive соединений и кэш ответов на
+# диске (SQLite). Повторный запуск упавшей ночной задачи берёт уже
+# загруженные страницы из кэша, а не со стороннего сайта
+
+import os
+import sqlite3
+import threading
+import time
+import typing as tp
+import zlib
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import settings
+
+
+class HttpClient:
+    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; '
+                             'Win64; x64) AppleWebKit/537.36 '
+                             '(KHTML, like Gecko) '
+                             'Chrome/92.0.4515.131 '
+                             'Safari/537.36 OPR/78.0.4093.147'}
+
+    def __init__(self, cache_path: tp.Optional[str] = None,
+                 max_size: int = 256 * 1024 * 1024,
+                 max_age: float = 6 * 60 * 60, pool_size: int = 32):
+        # ответы моложе max_age секунд отдаются из кэша без запроса,
+        # более старые перепроверяются по ETag/Last-Modified
+        self.max_age = max_age
+        # суммарный размер тел ответов в кэше (в байтах)
+        self.max_size = max_size
+
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        if cache_path is None:
+            cache_path = settings.HTTP_CACHE_PATH
+        directory = os.path.dirname(cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # запись идёт через одно соединение под блокировкой, а чтение -
+        # через пул соединений, по одному на поток (WAL не блокирует
+        # читателей)
+        self.cache_path = cache_path
+        self._lock = threading.Lock()
+        self._readers = []
+        self._connection = sqlite3.connect(cache_path,
+                                           check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'url TEXT PRIMARY KEY, body BLOB, encoding TEXT, etag TEXT, '
+            'last_modified TEXT, fetched_at REAL, accessed_at REAL, '
+            'size INTEGER)')
+        self._connection.execute(
+            'CREATE INDEX IF NOT EXISTS responses_accessed_at '
+            'ON responses (accessed_at)')
+        self._connection.commit()
+        self._size = self._connection.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+        # время обращений к ответам из кэша копится в памяти и записывается
+        # в базу пачкой: url -> (fetched_at или None, accessed_at)
+        self._touched = dict()
+        self.flush_every = 500
+
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    @staticmethod
+    def _make_response(url: str, body: bytes,
+                       encoding: tp.Optional[str]) -> requests.Response:
+        """
+        Ответ из кэша в виде обычного requests.Response
+        """
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.encoding = encoding
+        response._content = body
+        response.from_cache = True
+        return response
+
+    def _load(self, url: str) -> tp.Optional[tuple]:
+        with self._lock:
+            connection = self._readers.pop() if self._readers else None
+        if connection is None:
+            connection = sqlite3.connect(self.cache_path,
+                                         check_same_thread=False)
+        try:
+            row = connection.execute(
+                'SELECT body, encoding, etag, last_modified, fetched_at '
+                'FROM responses WHERE url = ?', (url,)).fetchone()
+        finally:
+            with self._lock:
+                self._readers.append(connection)
+        # перепроверенный ответ мог ещё не попасть в базу
+        fetched_at = self._touched.get(url, (None, None))[0]
+        if row is not None and fetched_at is not None:
+            row = row[:4] + (fetched_at,)
+        return row
+
+    def _touch(self, url: str, fetched: bool):
+        """
+        Отметка об обращении к ответу из кэша. В базу отметки записываются
+        пачкой из flush_every штук или вместе со следующей записью в кэш
+        """
+        now = time.time()
+        with self._lock:
+            previous = self._touched.get(url, (None, None))[0]
+            self._touched[url] = (now if fetched else previous, now)
+            if len(self._touched) >= self.flush_every:
+                self._flush()
+                self._connection.commit()
+
+    def _flush(self):
+        """
+        Запись накопленных отметок об обращениях. Вызывается под блокировкой
+        """
+        if not self._touched:
+            return
+        self._connection.executemany(
+            'UPDATE responses SET fetched_at = COALESCE(?, fetched_at), '
+            'accessed_at = ? WHERE url = ?',
+            [(fetched_at, accessed_at, url) for url, (fetched_at, accessed_at)
+             in self._touched.items()])
+        self._touched.clear()
+
+    def _store(self, url: str, response: requests.Response):
+        body = zlib.compress(response.content)
+        now = time.time()
+        with self._lock:
+            self._flush()
+            row = self._connection.execute(
+                'SELECT size FROM responses WHERE url = ?', (url,)).fetchone()
+            if row is not None:
+                self._size -= row[0]
+            self._connection.execute(
+                'INSERT OR REPLACE INTO responses VALUES '
+                '(?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, body, response.encoding, response.headers.get('ETag'),
+                 response.headers.get('Last-Modified'), now, now, len(body)))
+            self._size += len(body)
+            if self._size > self.max_size:
+                self._evict()
+            self._connection.commit()
+
+    def _evict(self):
+        """
+        Удаление давно не использовавшихся ответов, пока кэш не уменьшится
+        до 90% от max_size. Вызывается под блокировкой
+        """
+        rows = self._connection.execute(
+            'SELECT url, size FROM responses ORDER BY accessed_at')
+        evicted = []
+        for url, size in rows:
+            if self._size <= self.max_size * 0.9:
+                break
+            evicted.append((url,))
+            self._size -= size
+        self._connection.executemany(
+            'DELETE FROM responses WHERE url = ?', evicted)
+
+    def invalidate(self, url: str):
+        """
+        Удаление ответа из кэша, например, если страница оказалась
+        страницей с ошибкой и её нужно загрузить заново
+        """
+        with self._lock:
+            self._touched.pop(url, None)
+            row = self._connection.execute(
+                'SELECT size FROM responses WHERE url = ?', (url,)).fetchone()
+            if row is not None:
+                self._size -= row[0]
+                self._connection.execute(
+                    'DELETE FROM responses WHERE url = ?', (url,))
+                self._connection.commit()
+
+    def get(self, url: str, max_age: tp.Optional[float] = None,
+            rate_limiter=None, key=None,
+            validate: tp.Optional[tp.Callable[[requests.Response], bool]]
+            = None) -> requests.Response:
+        """
+        GET-запрос с кэшированием. Ограничитель частоты rate_limiter
+        (по ключу key) учитывается только для запросов, ушедших в сеть.
+        Кэшируются только успешные ответы, для которых validate (если
+        задана) возвращает True: сайты иногда отвечают 200 со страницей
+        ошибки или пустыми данными
+        """
+        if max_age is None:
+            max_age = self.max_age
+        cached = self._load(url)
+        headers = dict()
+        if cached is not None:
+            body, encoding, etag, last_modified, fetched_at = cached
+            if time.time() - fetched_at < max_age:
+                self.hits += 1
+                self._touch(url, fetched=False)
+                return self._make_response(url, zlib.decompress(body),
+                                           encoding)
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+
+        if rate_limiter is not None:
+            rate_limiter.acquire(key)
+        response = self.session.get(url, headers=headers)
+
+        if response.status_code == 304 and cached is not None:
+            self.revalidated += 1
+            self._touch(url, fetched=True)
+            return self._make_response(url, zlib.decompress(cached[0]),
+                                       cached[1])
+
+        self.misses += 1
+        response.from_cache = False
+        if response.status_code == 200 and \
+                (validate is None or validate(response)):
+            self._store(url, response)
+        return response
+
+    def stats(self) -> tp.Dict[str, int]:
+        return {'hits': self.hits, 'revalidated': self.revalidated,
+                'misses': self.misses, 'size': self._size}
+
+    def close(self):
+        self.session.close()
+        with self._lock:
+            self._flush()
+            self._connection.commit()
+            self._connection.close()
+            for connection in self._readers:
+                connection.close()
+            self._readers.clear()
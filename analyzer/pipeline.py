@@ -0,0 +1,223 @@
+# Формирование рейтинга в виде последовательности этапов. Результат каждого
+# этапа сохраняется в облако, поэтому после перезапуска дино задача
+# продолжается с последнего завершённого этапа, а не начинается заново
+
+import json
+import time
+import typing as tp
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+
+import pandas as pd
+
+
+class RankingPipeline:
+    stages = ('finviz_pe', 'finviz_roe', 'merge', 'yahoo', 'database',
+              'cloud')
+    checkpoint_prefix = 'checkpoints/'
+
+    def __init__(self, analyzer, day: date, chunk_size: int = 200):
+        self.analyzer = analyzer
+        self.cloud_manager = analyzer.cloud_manager
+        self.day = day
+        # число тикеров, после загрузки которых сохраняются прогнозы с yahoo
+        self.chunk_size = chunk_size
+        self.prefix = f'{self.checkpoint_prefix}{day.isoformat()}/'
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self) -> dict:
+        """
+        Описание уже выполненных этапов. Время начала запуска сохраняется,
+        чтобы при продолжении отметки о загрузке показателей не сдвигались
+        """
+        data = self.cloud_manager.get_bytes(self.prefix + 'manifest.json')
+        if data is None:
+            return {'day': self.day.isoformat(), 'started': time.time(),
+                    'completed': []}
+        manifest = json.loads(data)
+        print('Продолжение формирования рейтинга, выполненные этапы: '
+              + ', '.join(manifest['completed']))
+        return manifest
+
+    def _save_manifest(self):
+        self.cloud_manager.put_bytes(self.prefix + 'manifest.json',
+                                     json.dumps(self.manifest).encode())
+
+    def _is_completed(self, stage: str) -> bool:
+        return stage in self.manifest['completed']
+
+    def _complete(self, stage: str, frame: tp.Optional[pd.DataFrame] = None):
+        """
+        Сохранение результата этапа и отметка о его выполнении
+        """
+        if frame is not None:
+            self._save_frame(stage, frame)
+        self.manifest['completed'].append(stage)
+        self._save_manifest()
+
+    def _save_frame(self, stage: str, frame: pd.DataFrame):
+        self.cloud_manager.put_frame(frame, f'{self.prefix}{stage}.csv.gz')
+
+    def _load_frame(self, stage: str) -> tp.Optional[pd.DataFrame]:
+        # тикеры вроде NA не должны превращаться в NaN при чтении
+        return self.cloud_manager.get_frame(
+            f'{self.prefix}{stage}.csv.gz', keep_default_na=False,
+            na_values=[''])
+
+    @staticmethod
+    def last_weekday(day: date) -> date:
+        """
+        Последний будний день не позднее day, за который формируется рейтинг
+        """
+        return day - timedelta(max(day.weekday() - 4, 0))
+
+    @classmethod
+    def find_unfinished(cls, cloud_manager,
+                        not_before: date) -> tp.Optional[date]:
+        """
+        День последнего незавершённого запуска, если его контрольные точки
+        остались в облаке (например, дино перезапустился посреди задачи).
+        Запуски ранее not_before не продолжаются: загруженные сейчас данные
+        относились бы уже к другому дню. Их контрольные точки удалит
+        следующий запуск
+        """
+        days = sorted({filename[len(cls.checkpoint_prefix):].split('/')[0]
+                       for filename
+                       in cloud_manager.list_files(cls.checkpoint_prefix)
+                       if filename.endswith('/manifest.json')})
+        days = [day for day in map(date.fromisoformat, days)
+                if day >= not_before]
+        return days[-1] if days else None
+
+    def _remove_stale_checkpoints(self):
+        """
+        Удаление контрольных точек за предыдущие дни, оставшихся от упавших
+        запусков: рейтинг за этот день их заменяет
+        """
+        stale = [filename for filename
+                 in self.cloud_manager.list_files(self.checkpoint_prefix)
+                 if filename < self.prefix]
+        if stale:
+            self.cloud_manager.delete_many(stale)
+
+    def _run_finviz(self):
+        """
+        Оба прохода по скринеру выполняются одновременно, каждый сохраняется
+        сразу по завершении. Проход за ROE может быть не нужен
+        """
+        stages = {'finviz_pe': self.analyzer._get_pe_ranks,
+                  'finviz_roe': self.analyzer._get_roe_ranks}
+        if not self._is_completed('finviz_roe') and \
+                not self.analyzer._need_roe_ranks(self.manifest['started']):
+            print('Показатели ROE актуальны, проход по скринеру пропущен')
+            self.manifest['roe_skipped'] = True
+            self._complete('finviz_roe')
+
+        pending = [stage for stage in stages if not self._is_completed(stage)]
+        if not pending:
+            return
+        with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+            futures = {executor.submit(stages[stage]): stage
+                       for stage in pending}
+            # этап сохраняется сразу по завершении, даже если другой упал
+            errors = []
+            for future in as_completed(futures):
+                try:
+                    self._complete(futures[future], future.result())
+                except Exception as error:
+                    errors.append(error)
+            if errors:
+                raise errors[0]
+
+    def _is_estimated(self, estimation: pd.DataFrame) -> pd.Series:
+        """
+        Тикеры, по которым получен ответ: прогнозы загружены или у yahoo
+        точно нет данных. Тикеры, которые не удалось загрузить,
+        при продолжении запрашиваются снова
+        """
+        estimated = estimation['Rating'].notna()
+        empty_column = self.analyzer.yahoo_fetcher.empty_column
+        if empty_column in estimation:
+            estimated |= estimation[empty_column] == 1
+        return estimated
+
+    def _run_yahoo(self, ranking: pd.DataFrame) -> pd.DataFrame:
+        """
+        Загрузка прогнозов порциями по chunk_size тикеров. Каждая порция
+        сохраняется отдельным файлом, и при продолжении уже загруженные
+        тикеры повторно не запрашиваются
+        """
+        part_prefix = self.prefix + 'yahoo_part_'
+        parts = self.cloud_manager.list_files(part_prefix)
+        frames = [self.cloud_manager.get_frame(
+            part, keep_default_na=False, na_values=['']) for part in parts]
+        finished = set()
+        for frame in frames:
+            finished.update(frame.index[self._is_estimated(frame)])
+        tickers = [ticker for ticker in self.analyzer._get_estimation_tickers(
+                   ranking, self.manifest['started'])
+                   if ticker not in finished]
+
+        print('Загрузка данных с yahoo:')
+        deadline = time.monotonic() + self.analyzer.yahoo_fetcher.budget
+        for start in range(0, len(tickers), self.chunk_size):
+            chunk = tickers[start:start + self.chunk_size]
+            budget = max(deadline - time.monotonic(), 0)
+            frame = self.analyzer._get_estimation(chunk, budget)
+            self.cloud_manager.put_frame(
+                frame, f'{part_prefix}{len(frames):05d}.csv.gz')
+            frames.append(frame)
+
+        if not frames:
+            return self.analyzer._get_estimation([])
+        # тикер, который не удалось загрузить, мог быть загружен
+        # при продолжении - берётся последний ответ
+        estimation = pd.concat(frames)
+        return estimation[~estimation.index.duplicated(keep='last')]
+
+    def run(self) -> pd.DataFrame:
+        """
+        Выполнение ещё не завершённых этапов. После успешной выгрузки
+        рейтинга в облако контрольные точки удаляются
+        """
+        analyzer = self.analyzer
+        self._remove_stale_checkpoints()
+        # описание запуска сохраняется сразу, чтобы после перезапуска
+        # процесса его можно было найти (см. find_unfinished)
+        self._save_manifest()
+        if analyzer.ranking_state is not None:
+            analyzer.ranking_state.load()
+
+        self._run_finviz()
+        pe_ranks = self._load_frame('finviz_pe')
+        roe_ranks = None
+        if not self.manifest.get('roe_skipped'):
+            roe_ranks = self._load_frame('finviz_roe')
+
+        if not self._is_completed('merge'):
+            self._complete('merge',
+                           analyzer._get_new_ranking(pe_ranks, roe_ranks))
+        ranking = self._load_frame('merge')
+
+        if not self._is_completed('yahoo'):
+            estimation = self._run_yahoo(ranking)
+            self._complete('yahoo', estimation)
+        estimation = self._load_frame('yahoo')
+        ranking = analyzer._apply_estimation(ranking, estimation)
+
+        if not self._is_completed('database'):
+            analyzer._save_info_to_database(ranking)
+            self._complete('database')
+
+        if not self._is_completed('cloud'):
+            analyzer.ranking_archive.put(self.day, ranking)
+            analyzer.cloud_manager.put_frame(
+                ranking, analyzer.ranking_archive.get_ranking_filename(
+                    self.day))
+            analyzer._update_ranking_state(pe_ranks, roe_ranks, estimation,
+                                           self.manifest['started'])
+            self._complete('cloud')
+
+        self.cloud_manager.delete_many(
+            self.cloud_manager.list_files(self.prefix))
+        return ranking
@@ -0,0 +1,120 @@
+# Класс, хранящий время последней загрузки показателей по каждому тикеру.
+# Нужен для инкрементального обновления рейтинга: заново загружаются
+# только устаревшие значения
+
+import typing as tp
+import zlib
+
+import numpy as np
+import pandas as pd
+
+DAY = 24 * 60 * 60
+
+
+class RankingState:
+    filename = 'ranking_state.csv.gz'
+    columns = ['Price Updated', 'Fundamentals Updated', 'Targets Updated',
+               'Earnings Date', 'Targets Empty']
+
+    def __init__(self, cloud_manager, targets_max_age: float = 7,
+                 fundamentals_max_age: float = 30,
+                 empty_targets_max_age: float = 3):
+        self.cloud_manager = cloud_manager
+        # максимальный возраст прогнозов аналитиков и фундаментальных
+        # показателей (в днях)
+        self.targets_max_age = targets_max_age
+        self.fundamentals_max_age = fundamentals_max_age
+        # через сколько дней снова запрашивать тикеры, по которым у yahoo
+        # не оказалось прогнозов
+        self.empty_targets_max_age = empty_targets_max_age
+        # время везде хранится в секундах unix time, NaN - ещё не загружали
+        self.frame = pd.DataFrame(columns=self.columns, dtype=float)
+
+    def load(self):
+        """
+        Загрузка состояния из облака. Если его там нет, все показатели
+        считаются устаревшими
+        """
+        frame = self.cloud_manager.get_frame(
+            self.filename, keep_default_na=False, na_values=[''])
+        if frame is not None:
+            self.frame = frame.reindex(columns=self.columns).astype(float)
+
+    def save(self):
+        """
+        Сохранение состояния в облако
+        """
+        self.cloud_manager.put_frame(self.frame, self.filename)
+
+    def _get_column(self, tickers: tp.Sequence[str], name: str) -> np.ndarray:
+        return self.frame[name].reindex(tickers).to_numpy(dtype=float)
+
+    def _set_column(self, tickers: tp.Sequence[str], name: str, values):
+        tickers = pd.Index(tickers)
+        new_tickers = tickers.difference(self.frame.index)
+        if len(new_tickers):
+            self.frame = self.frame.reindex(
+                self.frame.index.append(new_tickers))
+        self.frame.loc[tickers, name] = values
+
+    def _reported_since(self, tickers: tp.Sequence[str], updated: np.ndarray,
+                        now: float) -> np.ndarray:
+        """
+        Вышла ли у компании отчётность после последней загрузки
+        """
+        earnings = self._get_column(tickers, 'Earnings Date')
+        return (earnings > updated) & (earnings <= now)
+
+    def stale_fundamentals(self, tickers: tp.Sequence[str],
+                           now: float) -> np.ndarray:
+        """
+        Маска тикеров, фундаментальные показатели (ROE) которых устарели:
+        вышла новая отчётность или прошло больше fundamentals_max_age дней
+        """
+        updated = self._get_column(tickers, 'Fundamentals Updated')
+        with np.errstate(invalid='ignore'):
+            expired = ~(now - updated <= self.fundamentals_max_age * DAY)
+        return expired | self._reported_since(tickers, updated, now)
+
+    def stale_targets(self, tickers: tp.Sequence[str],
+                      now: float) -> tp.List[str]:
+        """
+        Тикеры, прогнозы аналитиков по которым устарели. Срок жизни прогноза
+        для каждого тикера свой (от половины до полного targets_max_age),
+        чтобы обновления равномерно распределялись по дням. Тикеры, по
+        которым у yahoo не было данных, запрашиваются не чаще, чем раз
+        в empty_targets_max_age дней
+        """
+        updated = self._get_column(tickers, 'Targets Updated')
+        empty = self._get_column(tickers, 'Targets Empty')
+        spread = np.array([zlib.crc32(ticker.encode()) / 2 ** 32
+                           for ticker in tickers])
+        max_age = self.targets_max_age * DAY * (0.5 + 0.5 * spread)
+        with np.errstate(invalid='ignore'):
+            expired = ~(now - updated <= max_age)
+            waiting = now - empty <= self.empty_targets_max_age * DAY
+        stale = (expired | self._reported_since(tickers, updated, now)) \
+            & ~waiting
+        return [ticker for ticker, flag in zip(tickers, stale) if flag]
+
+    def mark_prices(self, tickers: tp.Sequence[str], now: float):
+        self._set_column(tickers, 'Price Updated', now)
+
+    def mark_fundamentals(self, tickers: tp.Sequence[str], now: float):
+        self._set_column(tickers, 'Fundamentals Updated', now)
+
+    def mark_targets(self, earnings_dates: pd.Series, now: float):
+        """
+        Отметка о загрузке прогнозов. Вместе с прогнозами с yahoo приходит
+        дата ближайшей отчётности, она тоже запоминается
+        """
+        tickers = earnings_dates.index
+        self._set_column(tickers, 'Targets Updated', now)
+        self._set_column(tickers, 'Earnings Date',
+                         earnings_dates.to_numpy(dtype=float))
+
+    def mark_empty_targets(self, tickers: tp.Sequence[str], now: float):
+        """
+        Отметка о тикерах, по которым у yahoo не оказалось прогнозов
+        """
+        self._set_column(tickers, 'Targets Empty', now)
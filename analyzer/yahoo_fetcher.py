@@ -0,0 +1,195 @@
+# Класс для параллельной загрузки прогнозов цен акций с finance.yahoo.com
+
+import random
+import threading
+import time
+import typing as tp
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import requests
+from tqdm import tqdm
+
+from analyzer.http_client import HttpClient
+from rate_limiter import RateLimiter
+
+
+class YahooFetcher:
+    url = 'https://query1.finance.yahoo.com/v10/finance/quoteSummary/{0}' \
+          '?modules=financialData,calendarEvents'
+    columns = ['Rating', 'Low Target', 'Current Price', 'Average Target',
+               'High Target']
+    earnings_column = 'Earnings Date'
+    # 1 - у yahoo нет прогнозов по тикеру, 0 - прогнозы загружены,
+    # NaN - загрузить не удалось
+    empty_column = 'No Data'
+
+    def __init__(self, max_workers: int = 16, min_interval: float = 0.02,
+                 attempts: int = 5, backoff: float = 0.5,
+                 max_backoff: float = 30.0, budget: float = 3600.0,
+                 http_client: tp.Optional[HttpClient] = None):
+        self.max_workers = max_workers
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # ограничение на время одного запуска (в секундах)
+        self.budget = budget
+
+        if http_client is None:
+            http_client = HttpClient()
+        self.http_client = http_client
+
+        self.rate_limiter = RateLimiter(min_interval)
+
+    def get_quote_estimation(self, ticker: str) -> tp.List[float]:
+        """
+        Получение текущей цены и прогнозов на цену акции, а также значения
+        "привлекательности" этой акции для покупки по версии yahoo.
+        Последним элементом идёт дата ближайшей отчётности (unix time)
+        """
+        response = self.http_client.get(
+            self.url.format(ticker.replace('@', '.')),
+            rate_limiter=self.rate_limiter, validate=self._is_valid_response)
+        response.raise_for_status()
+        result = response.json()['quoteSummary']['result'][0]
+        data = result['financialData']
+        return [data['recommendationMean']['raw'],
+                data['targetLowPrice']['raw'],
+                data['currentPrice']['raw'],
+                data['targetMeanPrice']['raw'],
+                data['targetHighPrice']['raw'],
+                self._get_earnings_date(result)]
+
+    @staticmethod
+    def _get_earnings_date(result: dict) -> float:
+        """
+        Дата ближайшей отчётности компании, если yahoo её знает
+        """
+        try:
+            dates = result['calendarEvents']['earnings']['earningsDate']
+            return float(dates[0]['raw'])
+        except (KeyError, IndexError, TypeError):
+            return np.nan
+
+    @staticmethod
+    def _is_valid_response(response: requests.Response) -> bool:
+        """
+        Ответ можно кэшировать, только если в нём есть прогнозы. Yahoo
+        отвечает 200 и при ошибке (поле error) или пустом результате
+        """
+        try:
+            summary = response.json()['quoteSummary']
+            return summary.get('error') is None and \
+                'financialData' in summary['result'][0]
+        except (ValueError, KeyError, IndexError, TypeError):
+            return False
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        """
+        Повторять имеет смысл только ошибки соединения, 429 и 5xx. Остальные
+        ответы 4xx (например, 404 для несуществующего тикера) не изменятся
+        """
+        if isinstance(error, requests.HTTPError) and \
+                error.response is not None:
+            status = error.response.status_code
+            return status == 429 or status >= 500
+        return True
+
+    @staticmethod
+    def _get_retry_after(error: Exception) -> tp.Optional[float]:
+        """
+        Задержка для ответа 429: значение заголовка Retry-After в секундах
+        или 0, если заголовка нет. Для остальных ошибок - None
+        """
+        if not isinstance(error, requests.HTTPError) or \
+                error.response is None or \
+                error.response.status_code != 429:
+            return None
+        try:
+            return float(error.response.headers.get('Retry-After', 0))
+        except ValueError:
+            # Retry-After может быть задан датой
+            return 0.0
+
+    def _fetch_with_retries(self, ticker: str, deadline: float,
+                            stop: threading.Event) \
+            -> tp.Optional[tp.List[float]]:
+        """
+        Загрузка прогнозов с повторными попытками и экспоненциальной
+        задержкой со случайной составляющей. Возвращает None, если загрузить
+        не удалось, и пустой список, если у yahoo нет данных по тикеру
+        """
+        for attempt in range(self.attempts):
+            if stop.is_set():
+                return None
+            try:
+                return self.get_quote_estimation(ticker)
+            except (KeyError, IndexError, TypeError):
+                # у yahoo нет нужных данных по тикеру, повторять бессмысленно
+                return []
+            except Exception as error:
+                if isinstance(error, requests.HTTPError) and \
+                        error.response is not None and \
+                        error.response.status_code == 404:
+                    # тикер yahoo неизвестен
+                    return []
+                if not self._is_retryable(error):
+                    return None
+                delay = random.uniform(
+                    0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                retry_after = self._get_retry_after(error)
+                if retry_after is not None:
+                    delay = min(self.max_backoff, max(delay, retry_after))
+                if time.monotonic() + delay > deadline:
+                    stop.set()
+                    return None
+                if retry_after is not None:
+                    # на 429 приостанавливаются все потоки, а не только этот:
+                    # следующий запрос дождётся разрешения ограничителя
+                    self.rate_limiter.defer(delay)
+                else:
+                    time.sleep(delay)
+        return None
+
+    def fetch(self, tickers: tp.List[str], earnings: bool = False,
+              budget: tp.Optional[float] = None,
+              empty: bool = False) -> pd.DataFrame:
+        """
+        Получение текущих цен и прогнозов на цены акций для заданных тикеров.
+        По тикерам, которые не удалось загрузить, в таблице остаются NaN.
+        При earnings=True в таблицу добавляется дата ближайшей отчётности,
+        при empty=True - колонка empty_column, отличающая тикеры без данных
+        у yahoo от тикеров, которые не удалось загрузить.
+        budget позволяет задать для этого вызова своё ограничение по времени
+        """
+        columns = self.columns + [self.earnings_column, self.empty_column]
+        values = np.full((len(tickers), len(columns)), np.nan)
+        if budget is None:
+            budget = self.budget
+        deadline = time.monotonic() + budget
+        stop = threading.Event()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._fetch_with_retries, ticker,
+                                       deadline, stop): i
+                       for i, ticker in enumerate(tickers)}
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                result = future.result()
+                if result:
+                    values[futures[future], :-1] = result
+                    values[futures[future], -1] = 0.0
+                elif result is not None:
+                    values[futures[future], -1] = 1.0
+                if time.monotonic() > deadline:
+                    stop.set()
+
+        if stop.is_set():
+            print('Превышено время на загрузку данных с yahoo')
+        frame = pd.DataFrame(values, index=tickers, columns=columns)
+        if not earnings:
+            frame = frame.drop(columns=self.earnings_column)
+        if not empty:
+            frame = frame.drop(columns=self.empty_column)
+        return frame
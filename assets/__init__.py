@@ -1 +1,9 @@
-from assets.portfolio import Portfolio
+# Классы пакета загружаются при первом обращении
+from lazy_import import lazy_getattr
+
+_modules = {
+    'Portfolio': 'assets.portfolio'
+}
+__all__ = list(_modules)
+
+__getattr__ = lazy_getattr(__name__, _modules)
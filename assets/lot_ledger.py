@@ -0,0 +1,168 @@
+# Журнал лотов портфеля. Лоты хранятся по столбцам в массивах numpy,
+# а для каждого тикера поддерживается очередь открытых лотов (FIFO).
+# Таблица pandas строится только по запросу, например, для сохранения
+
+import typing as tp
+from collections import deque
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+
+class LotLedger:
+    columns = ['ticker', 'number', 'open_price', 'close_price', 'open_date',
+               'close_date', 'is_closed']
+
+    def __init__(self, capacity: int = 64):
+        self._size = 0
+        self._ticker = np.empty(capacity, dtype=object)
+        self._number = np.zeros(capacity, dtype=np.int64)
+        self._open_price = np.full(capacity, np.nan)
+        self._close_price = np.full(capacity, np.nan)
+        self._open_date = np.full(capacity, np.datetime64('NaT'),
+                                  dtype='datetime64[ns]')
+        self._close_date = np.full(capacity, np.datetime64('NaT'),
+                                   dtype='datetime64[ns]')
+        self._is_closed = np.zeros(capacity, dtype=bool)
+        self._open_lots = dict()
+        self._frame = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _grow(self) -> None:
+        """
+        Увеличение ёмкости массивов вдвое
+        """
+        capacity = len(self._number)
+        for name, fill in (('_ticker', None), ('_number', 0),
+                           ('_open_price', np.nan), ('_close_price', np.nan),
+                           ('_open_date', np.datetime64('NaT')),
+                           ('_close_date', np.datetime64('NaT')),
+                           ('_is_closed', False)):
+            array = getattr(self, name)
+            extension = np.full(capacity, fill, dtype=array.dtype)
+            setattr(self, name, np.concatenate([array, extension]))
+
+    def _append(self, ticker: str, number: int, open_price: float,
+                open_date, close_price: float = np.nan, close_date=None,
+                is_closed: bool = False) -> int:
+        if self._size == len(self._number):
+            self._grow()
+        idx = self._size
+        self._ticker[idx] = ticker
+        self._number[idx] = number
+        self._open_price[idx] = open_price
+        self._open_date[idx] = self._to_datetime64(open_date)
+        self._close_price[idx] = close_price
+        self._close_date[idx] = self._to_datetime64(close_date)
+        self._is_closed[idx] = is_closed
+        self._size += 1
+        if not is_closed:
+            self._open_lots.setdefault(ticker, deque()).append(idx)
+        self._frame = None
+        return idx
+
+    @staticmethod
+    def _to_datetime64(value) -> np.datetime64:
+        if value is None or pd.isna(value):
+            return np.datetime64('NaT')
+        return pd.Timestamp(value).to_datetime64()
+
+    def buy(self, ticker: str, number: int, price: float,
+            purchase_date: date) -> None:
+        self._append(ticker, number, price, purchase_date)
+
+    def open_number(self, ticker: str) -> int:
+        """
+        Количество акций тикера в открытых лотах
+        """
+        return int(sum(self._number[idx]
+                       for idx in self._open_lots.get(ticker, ())))
+
+    def sell(self, ticker: str, number: int, price: float,
+             sale_date: date) -> bool:
+        """
+        Закрытие лотов тикера в порядке их открытия (FIFO). Если лот
+        продаётся частично, он делится на проданную и оставшуюся части
+        """
+        if self.open_number(ticker) < number:
+            return False
+
+        lots = self._open_lots.get(ticker, deque())
+        rest = number
+        while lots and (rest > 0 or self._number[lots[0]] == 0):
+            idx = lots[0]
+            if self._number[idx] <= rest:
+                rest -= self._number[idx]
+                self._close_price[idx] = price
+                self._close_date[idx] = self._to_datetime64(sale_date)
+                self._is_closed[idx] = True
+                lots.popleft()
+            else:
+                self._number[idx] -= rest
+                self._append(ticker, rest, self._open_price[idx],
+                             self._open_date[idx], price, sale_date, True)
+                rest = 0
+        if not lots:
+            self._open_lots.pop(ticker, None)
+        self._frame = None
+        return True
+
+    def get_shares_dict(self) -> tp.Dict[str, int]:
+        """
+        Количество акций в открытых лотах по каждому тикеру
+        """
+        return {ticker: self.open_number(ticker)
+                for ticker in self._open_lots}
+
+    def last_open_prices(self) -> tp.Dict[str, float]:
+        """
+        Цена покупки последнего открытого лота по каждому тикеру
+        """
+        return {ticker: float(self._open_price[lots[-1]])
+                for ticker, lots in self._open_lots.items() if lots}
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Представление журнала в виде таблицы. Таблица кэшируется до
+        следующего изменения журнала
+        """
+        if self._frame is None:
+            size = self._size
+            self._frame = pd.DataFrame({
+                'ticker': self._ticker[:size].astype(str),
+                'number': self._number[:size].copy(),
+                'open_price': self._open_price[:size].copy(),
+                'close_price': self._close_price[:size].copy(),
+                'open_date': self._open_date[:size].copy(),
+                'close_date': self._close_date[:size].copy(),
+                'is_closed': self._is_closed[:size].copy()
+            }, columns=self.columns)
+        return self._frame
+
+    @classmethod
+    def from_frame(cls, table: pd.DataFrame) -> 'LotLedger':
+        """
+        Построение журнала по таблице. Поддерживаются также старые таблицы
+        с колонками closed_price и closed_date
+        """
+        table = table.copy()
+        for column, legacy in (('close_price', 'closed_price'),
+                               ('close_date', 'closed_date')):
+            if column not in table:
+                table[column] = np.nan
+            if legacy in table:
+                table[column] = table[column].fillna(table[legacy])
+
+        table['open_date'] = pd.to_datetime(table['open_date'])
+        table['close_date'] = pd.to_datetime(table['close_date'])
+        table = table.sort_values(by='open_date', kind='mergesort')
+
+        ledger = cls(capacity=max(64, 2 * len(table)))
+        for row in table[cls.columns].itertuples(index=False):
+            ledger._append(row.ticker, row.number, row.open_price,
+                           row.open_date, row.close_price, row.close_date,
+                           bool(row.is_closed))
+        return ledger
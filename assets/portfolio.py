@@ -5,24 +5,19 @@ import os
 import typing as tp
 from datetime import date, timedelta
 
-import numpy as np
 import pandas as pd
 
+from assets.lot_ledger import LotLedger
 from storage import CloudManager, DatabaseManager
 
 
 class Portfolio:
     def __init__(self, filename: tp.Optional[str] = None):
-        self.shares_table = pd.DataFrame({
-            'ticker': pd.Series([], dtype=str),
-            'number': pd.Series([], dtype=np.int),
-            'open_price': pd.Series([], dtype=np.float),
-            'close_price': pd.Series([], dtype=np.float),
-            'open_date': pd.Series([], dtype='datetime64[ns]'),
-            'close_date': pd.Series([], dtype='datetime64[ns]'),
-            'is_closed': pd.Series([], dtype=np.bool)
-        })
+        self.ledger = LotLedger()
         self.history = {}
+        # последние известные цены тикеров портфеля, которыми оцениваются
+        # позиции, если в базе цены нет
+        self.last_prices = {}
         self.initial_funds = 100000.0
         self.free_funds = 100000.0
         self.cloud_manager = CloudManager()
@@ -30,6 +25,14 @@ class Portfolio:
         if filename is not None:
             self.load(filename)
 
+    @property
+    def shares_table(self) -> pd.DataFrame:
+        return self.ledger.to_frame()
+
+    @shares_table.setter
+    def shares_table(self, table: pd.DataFrame) -> None:
+        self.ledger = LotLedger.from_frame(table)
+
     def buy(self, share_ticker: str, number: int,
             price: tp.Optional[float] = None,
             purchase_date: date = date.today()) -> bool:
@@ -45,11 +48,7 @@ class Portfolio:
             print('Недостаточно средств для покупки')
             return False
 
-        row = {'ticker': share_ticker, 'number': number, 'open_price': price,
-               'closed_price': None, 'open_date': purchase_date,
-               'closed_date': None, 'is_closed': False}
-        self.shares_table = self.shares_table.append(row, ignore_index=True)
-
+        self.ledger.buy(share_ticker, number, price, purchase_date)
         self.free_funds -= cost
         return True
 
@@ -63,54 +62,22 @@ class Portfolio:
         if price is None:
             price = self.database_manager.get_share_info(share_ticker)['price']
 
-        shares = self.shares_table[self.shares_table['ticker'] == share_ticker]
-        others1 = shares[shares['is_closed']]
-        shares = shares[~shares['is_closed']]
-
         # проверяем, есть ли в портфеле такое количество акций
-        shares_number = shares['number'].sum()
+        shares_number = self.ledger.open_number(share_ticker)
         if shares_number < number:
             print("В портфеле недостаточно акций. В нём {} акций {}".format(
                 shares_number, share_ticker))
             return False
 
-        shares = shares.sort_values(by=['open_date']).reset_index(drop=True)
-        shares_cumsum = shares['number'].cumsum()
-        sold_shares = (shares_cumsum <= number)
-
-        # если необходимо, делим одну из ячеек на две (проданные и нет)
-        sold_len = sold_shares.sum()
-        if sold_len > 0:
-            lower_bound = shares_cumsum[sold_shares].iloc[-1]
-        else:
-            lower_bound = 0
-
-        if lower_bound < number:
-            new_row = shares.loc[sold_len].copy()
-            new_row['number'] = number - lower_bound
-            shares = shares.append(new_row, ignore_index=True)
-
-            shares.loc[sold_len, 'number'] -= new_row['number']
-            sold_shares = sold_shares.append(pd.Series([True]),
-                                             ignore_index=True)
-
-        shares.loc[sold_shares, 'closed_price'] = price
-        shares.loc[sold_shares, 'closed_date'] = sale_date
-        shares.loc[sold_shares, 'is_closed'] = True
-
-        others2 = self.shares_table[self.shares_table['ticker'] != share_ticker]
-        self.shares_table = pd.concat([others1, others2, shares])
-        self.shares_table.index = np.arange(len(self.shares_table))
+        self.ledger.sell(share_ticker, number, price, sale_date)
         self.free_funds += number * price
         return True
 
     def _save_table(self, table: pd.DataFrame, filename: str) -> None:
         """
-        Сохранение табличных данных в csv-файл
+        Сохранение табличных данных в csv-файл в облаке
         """
-        table.to_csv(filename)
-        self.cloud_manager.upload_to_cloud(filename)
-        os.remove(filename)
+        self.cloud_manager.put_frame(table, filename)
 
     def save(self, filename: str) -> None:
         """
@@ -122,52 +89,77 @@ class Portfolio:
             'initial_funds': self.initial_funds,
             'free_funds': self.free_funds,
             'shares_table': shares_filename,
-            'history': self.history
+            'history': self.history,
+            'last_prices': self.last_prices
         }
-        with open(filename, 'w', encoding='utf-8') as json_file:
-            json.dump(data, json_file)
-        self.cloud_manager.upload_to_cloud(filename)
-        os.remove(filename)
+        self.cloud_manager.put_bytes(filename, json.dumps(data).encode('utf-8'))
 
         self._save_table(self.shares_table, shares_filename)
 
     def _load_table(self, filename: str) -> pd.DataFrame:
         """
-        Загрузка табличных данных из csv-файла
+        Загрузка табличных данных из csv-файла в облаке
         """
-        self.cloud_manager.download_from_cloud(filename)
-        table = pd.read_csv(filename, index_col=0)
-        os.remove(filename)
-        return table
+        return self.cloud_manager.get_frame(filename)
 
     def load(self, filename: str) -> None:
         """
         Загрузка прортфеля из файла
         """
-        self.cloud_manager.download_from_cloud(filename)
-        with open(filename, 'r', encoding='utf-8') as json_file:
-            data = json.load(json_file)
-        os.remove(filename)
+        data = json.loads(self.cloud_manager.get_bytes(filename)
+                          .decode('utf-8'))
 
         self.initial_funds = data['initial_funds']
         self.free_funds = data['free_funds']
         self.history = data['history']
+        self.last_prices = data.get('last_prices', {})
         self.shares_table = self._load_table(data['shares_table'])
 
-    def get_all_funds(self) -> float:
-        """
-        Получение текущей стоимости портфеля
-        """
-        all_funds = self.free_funds
-        shares = self.shares_table[~self.shares_table['is_closed']]
-
-        # считаем текущую стоимомть всех акций в портфеле
-        for i, share in shares.iterrows():
-            ticker = share['ticker']
-            num = share['number']
-            term = self.database_manager.get_share_info(ticker)['price'] * num
-            all_funds += term
-
+    def get_valuation(self) -> pd.DataFrame:
+        """
+        Оценка открытых позиций по текущим ценам. Цены всех тикеров
+        запрашиваются одним обращением к базе, позиции без цены оцениваются
+        по последней известной цене (колонка stale)
+        """
+        numbers = pd.Series(self.ledger.get_shares_dict(),
+                            dtype=float).sort_index()
+        prices = pd.Series(
+            self.database_manager.get_share_prices(numbers.index.tolist()),
+            dtype=float).reindex(numbers.index)
+
+        known = prices.dropna()
+        self.last_prices.update(known.to_dict())
+
+        # пропавшие из базы цены заменяются последними известными,
+        # а если их нет - ценой покупки последнего открытого лота
+        missing = prices.index[prices.isna()]
+        if len(missing):
+            fallback = pd.Series(self.last_prices, dtype=float).combine_first(
+                pd.Series(self.ledger.last_open_prices(), dtype=float))
+            prices = prices.fillna(fallback.reindex(numbers.index))
+            print(f'Нет цен в базе для тикеров {missing.tolist()}, '
+                  'используются последние известные цены')
+        excluded = prices.index[prices.isna()].tolist()
+        if excluded:
+            print(f'Тикеры {excluded} исключены из оценки портфеля: '
+                  'цена неизвестна')
+
+        valuation = pd.DataFrame({'number': numbers, 'price': prices,
+                                  'stale': numbers.index.isin(missing)})
+        valuation['value'] = (valuation['number'] * valuation['price']) \
+            .fillna(0.0)
+        return valuation
+
+    def get_all_funds(self, by_ticker: bool = False) \
+            -> tp.Union[float, tp.Tuple[float, pd.DataFrame]]:
+        """
+        Получение текущей стоимости портфеля. Если by_ticker=True,
+        дополнительно возвращается стоимость позиций по каждому тикеру
+        """
+        valuation = self.get_valuation()
+        all_funds = self.free_funds + valuation['value'].sum()
+        if by_ticker:
+            return all_funds, valuation
         return all_funds
 
     def get_total_profitability(self) -> float:
@@ -194,8 +186,7 @@ class Portfolio:
         Получение тикеров всех акций, находящихся в портфеле, вместе
         с их количеством
         """
-        shares = self.shares_table[~self.shares_table['is_closed']]
-        return shares.groupby(by='ticker')['number'].sum().to_dict()
+        return self.ledger.get_shares_dict()
 
     def update_history(self) -> None:
         """
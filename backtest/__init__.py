@@ -0,0 +1,2 @@
+from backtest.backtester import Backtester
+from backtest.ranking_panel import RankingPanel
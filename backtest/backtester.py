@@ -0,0 +1,85 @@
+# Тестирование стратегии отбора акций на исторических рейтингах.
+# Повторяет логику Analyzer.update_portfolio и семантику Portfolio
+
+import argparse
+import typing as tp
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from backtest.ranking_panel import RankingPanel
+
+
+class Backtester:
+    def __init__(self, panel: RankingPanel, initial_funds: float = 100000.0):
+        self.panel = panel
+        self.initial_funds = initial_funds
+
+    def run(self, companies_number: int = 5, prefilter_multiplier: int = 6,
+            sort_by: tp.Sequence[str] = ('Rating', 'Summary rang')) \
+            -> pd.Series:
+        """
+        Ежедневная ребалансировка портфеля по рейтингам панели.
+        Возвращает кривую стоимости портфеля
+        """
+        panel = self.panel
+        free_funds = self.initial_funds
+        holdings = dict()
+        equity = np.empty(len(panel.dates))
+
+        for day in range(len(panel.dates)):
+            prices = panel.prices[day]
+            best = panel.select(day, companies_number, prefilter_multiplier,
+                                sort_by).tolist()
+
+            # продажа акций, покинувших топ рейтинга
+            tickers_count = 0
+            for ticker in list(holdings):
+                if ticker not in best:
+                    free_funds += holdings.pop(ticker) * prices[ticker]
+                    tickers_count += 1
+
+            # покупка акций, только что попавших в топ рейтинга
+            money_per_ticker = free_funds / max(tickers_count, 1)
+            for ticker in best:
+                if ticker not in holdings:
+                    price = prices[ticker]
+                    number = money_per_ticker // price
+
+                    tickers_count -= 1
+                    if tickers_count > 0:
+                        rest = money_per_ticker - price * number
+                        money_per_ticker += rest / tickers_count
+
+                    if number * price <= free_funds:
+                        holdings[ticker] = number
+                        free_funds -= number * price
+
+            equity[day] = free_funds + sum(
+                number * prices[ticker] for ticker, number in holdings.items())
+
+        return pd.Series(equity, index=pd.DatetimeIndex(panel.dates),
+                         name='equity')
+
+    def profitability(self, equity: pd.Series) -> float:
+        """
+        Прибыльность стратегии за весь период
+        """
+        return equity.iloc[-1] / self.initial_funds - 1.0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('directory')
+    parser.add_argument('--start', type=date.fromisoformat)
+    parser.add_argument('--end', type=date.fromisoformat)
+    parser.add_argument('--companies', type=int, default=5)
+    args = parser.parse_args()
+
+    backtester = Backtester(
+        RankingPanel.from_directory(args.directory, args.start, args.end))
+    equity = backtester.run(args.companies)
+    print(equity.to_string())
+    print('Прибыльность: {:.2f}%'.format(
+        backtester.profitability(equity) * 100))
@@ -0,0 +1,139 @@
+# Панель исторических рейтингов: ежедневные таблицы ordered_ranks_*.csv,
+# загруженные один раз в двумерные массивы (дата x тикер)
+
+import os
+import re
+import typing as tp
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+
+class RankingPanel:
+    columns = ('Current Price', 'Average Target', 'Rating', 'Summary rang')
+    filename_pattern = re.compile(r'ordered_ranks_(\d{4}_\d{2}_\d{2})\.csv$')
+
+    def __init__(self, dates: np.ndarray, tickers: np.ndarray,
+                 values: tp.Dict[str, np.ndarray], order: np.ndarray,
+                 counts: np.ndarray, complete: np.ndarray,
+                 prices: tp.Optional[np.ndarray] = None):
+        # даты и тикеры, соответствующие осям массивов
+        self.dates = dates
+        self.tickers = tickers
+        # значения колонок рейтинга, NaN - тикера в этот день не было
+        self.values = values
+        # индексы тикеров в порядке строк исходной таблицы за каждый день
+        self.order = order
+        self.counts = counts
+        # в строке нет пропусков (аналог dropna)
+        self.complete = complete
+        # цены с протягиванием последнего известного значения для оценки
+        # позиций по тикерам, пропавшим из рейтинга
+        if prices is None:
+            prices = pd.DataFrame(values['Current Price']).ffill().to_numpy()
+        self.prices = prices
+
+    @classmethod
+    def from_frames(cls, frames: tp.Dict[date, pd.DataFrame]) \
+            -> 'RankingPanel':
+        """
+        Построение панели по таблицам рейтинга, ключ словаря - дата рейтинга
+        """
+        dates = sorted(frames)
+        tickers = pd.Index(sorted(set().union(
+            *(frame.index for frame in frames.values()))))
+        shape = (len(dates), len(tickers))
+
+        values = {column: np.full(shape, np.nan) for column in cls.columns}
+        order = np.zeros(shape, dtype=np.int64)
+        counts = np.zeros(len(dates), dtype=np.int64)
+        complete = np.zeros(shape, dtype=bool)
+        for i, day in enumerate(dates):
+            frame = frames[day]
+            idx = tickers.get_indexer(frame.index)
+            for column in cls.columns:
+                values[column][i, idx] = frame[column].to_numpy(dtype=float)
+            order[i, :len(idx)] = idx
+            counts[i] = len(idx)
+            complete[i, idx] = frame.notna().all(axis=1).to_numpy()
+
+        return cls(np.array(dates, dtype='datetime64[D]'),
+                   tickers.to_numpy(), values, order, counts, complete)
+
+    @classmethod
+    def from_directory(cls, directory: str, start: tp.Optional[date] = None,
+                       end: tp.Optional[date] = None) -> 'RankingPanel':
+        """
+        Загрузка рейтингов за диапазон дат (границы включительно)
+        из каталога, например, из созданного storage_backup.py
+        """
+        frames = dict()
+        for filename in os.listdir(directory):
+            match = cls.filename_pattern.match(filename)
+            if match is None:
+                continue
+            day = datetime.strptime(match.group(1), '%Y_%m_%d').date()
+            if (start is None or day >= start) and (end is None or day <= end):
+                # пропуском считается только пустая ячейка, а не тикер NA
+                frames[day] = pd.read_csv(os.path.join(directory, filename),
+                                          index_col=0, keep_default_na=False,
+                                          na_values=[''])
+        return cls.from_frames(frames)
+
+    @classmethod
+    def from_archive(cls, archive, start: tp.Optional[date] = None,
+                     end: tp.Optional[date] = None) -> 'RankingPanel':
+        """
+        Загрузка рейтингов за диапазон дат из storage.RankingArchive
+        """
+        return cls.from_frames(archive.get_range(start, end))
+
+    def select(self, day: int, companies_number: int = 5,
+               prefilter_multiplier: int = 6,
+               sort_by: tp.Sequence[str] = ('Rating', 'Summary rang')) \
+            -> np.ndarray:
+        """
+        Аналог Analyzer._selection_function для одного дня панели.
+        Возвращает индексы отобранных тикеров
+        """
+        idx = self.order[day, :self.counts[day]]
+        undervalued = (self.values['Current Price'][day, idx]
+                       < self.values['Average Target'][day, idx])
+        candidates = idx[undervalued][:companies_number * prefilter_multiplier]
+        candidates = candidates[self.complete[day, candidates]]
+        keys = [self.values[column][day, candidates]
+                for column in reversed(sort_by)]
+        return candidates[np.lexsort(keys)][:companies_number]
+
+    def _arrays(self) -> tp.Dict[str, np.ndarray]:
+        arrays = {'dates': self.dates, 'tickers': self.tickers.astype(str),
+                  'order': self.order, 'counts': self.counts,
+                  'complete': self.complete, 'prices': self.prices}
+        for i, column in enumerate(self.columns):
+            arrays[f'values_{i}'] = self.values[column]
+        return arrays
+
+    def to_memmap(self, directory: str) -> None:
+        """
+        Сохранение панели в каталог в виде .npy файлов, которые затем
+        отображаются в память без копирования (см. from_memmap)
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name, array in self._arrays().items():
+            np.save(os.path.join(directory, name + '.npy'), array)
+
+    @classmethod
+    def from_memmap(cls, directory: str) -> 'RankingPanel':
+        """
+        Открытие сохранённой панели. Массивы отображаются в память
+        только для чтения и разделяются между процессами
+        """
+        def load(name):
+            return np.load(os.path.join(directory, name + '.npy'),
+                           mmap_mode='r')
+
+        values = {column: load(f'values_{i}')
+                  for i, column in enumerate(cls.columns)}
+        return cls(load('dates'), load('tickers'), values, load('order'),
+                   load('counts'), load('complete'), load('prices'))
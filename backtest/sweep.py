@@ -0,0 +1,80 @@
+# Перебор параметров функции отбора акций на нескольких ядрах.
+# Панель рейтингов передаётся процессам через отображаемые в память файлы,
+# а не копируется в каждый процесс
+
+import argparse
+import itertools
+import os
+import tempfile
+import typing as tp
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import pandas as pd
+
+from backtest.backtester import Backtester
+from backtest.ranking_panel import RankingPanel
+
+# панель, открытая в процессе-исполнителе
+_panel = None
+
+
+def _init_worker(directory: str) -> None:
+    global _panel
+    _panel = RankingPanel.from_memmap(directory)
+
+
+def _run_backtest(params: tp.Dict[str, tp.Any]) -> tp.Dict[str, tp.Any]:
+    backtester = Backtester(_panel)
+    equity = backtester.run(**params)
+    drawdown = (equity / equity.cummax() - 1.0).min()
+    return dict(params, profitability=backtester.profitability(equity),
+                max_drawdown=drawdown)
+
+
+class ParameterSweep:
+    def __init__(self, panel: RankingPanel,
+                 max_workers: tp.Optional[int] = None):
+        self.panel = panel
+        self.max_workers = max_workers or os.cpu_count()
+
+    def run(self, companies_numbers: tp.Iterable[int] = (3, 5, 7, 10),
+            prefilter_multipliers: tp.Iterable[int] = (2, 4, 6, 8),
+            sort_orders: tp.Iterable[tp.Tuple[str, ...]] = (
+                    ('Rating', 'Summary rang'), ('Summary rang', 'Rating'))) \
+            -> pd.DataFrame:
+        """
+        Тестирование всех сочетаний параметров. Возвращает таблицу
+        с прибыльностью и максимальной просадкой для каждого сочетания
+        """
+        grid = [{'companies_number': number,
+                 'prefilter_multiplier': multiplier,
+                 'sort_by': tuple(sort_by)}
+                for number, multiplier, sort_by in itertools.product(
+                    companies_numbers, prefilter_multipliers, sort_orders)]
+
+        with tempfile.TemporaryDirectory() as directory:
+            self.panel.to_memmap(directory)
+            with ProcessPoolExecutor(max_workers=self.max_workers,
+                                     initializer=_init_worker,
+                                     initargs=(directory,)) as executor:
+                chunksize = max(1, len(grid) // (4 * self.max_workers))
+                results = list(executor.map(_run_backtest, grid,
+                                            chunksize=chunksize))
+
+        return pd.DataFrame(results).sort_values('profitability',
+                                                 ascending=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('directory')
+    parser.add_argument('--start', type=date.fromisoformat)
+    parser.add_argument('--end', type=date.fromisoformat)
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args()
+
+    sweep = ParameterSweep(
+        RankingPanel.from_directory(args.directory, args.start, args.end),
+        args.workers)
+    print(sweep.run().to_string(index=False))
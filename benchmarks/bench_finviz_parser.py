@@ -0,0 +1,106 @@
+# Замер скорости разбора страниц скринера finviz: прежний разбор через
+# BeautifulSoup против FinvizParser (lxml + XPath), а также полный обход
+# скринера с имитацией сетевой задержки, где загрузка и разбор идут
+# одновременно. Запуск: python -m benchmarks.bench_finviz_parser [--repeat N]
+
+import argparse
+import os
+import time
+
+import numpy as np
+import requests
+from bs4 import BeautifulSoup
+
+# замер не обращается к базе, но settings требует DATABASE_URL при импорте
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from analyzer.finviz_crawler import FinvizCrawler
+from analyzer.finviz_parser import FinvizParser
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       'fixtures', 'finviz_screener_v111.html')
+
+
+def parse_with_soup(html, params):
+    """
+    Разбор страницы так, как это делалось раньше: полное дерево
+    BeautifulSoup и перевод в числа по одной ячейке
+    """
+    soup = BeautifulSoup(html, 'lxml')
+    tbl = soup.find('table', class_='table-light')
+    rows = []
+    for row in tbl.find_all('tr', valign='top'):
+        tds = row.find_all('td')
+        values = []
+        for param in params:
+            string_value = tds[param].text.strip('%').replace(',', '')
+            if string_value == '-':
+                string_value = 'NaN'
+            values.append(float(string_value))
+        rows.append((tds[1].text, int(tds[0].text), tuple(values)))
+    return rows
+
+
+class FakeHttpClient:
+    """
+    Клиент, отдающий сохранённую страницу с фиксированной задержкой
+    """
+    def __init__(self, html, latency):
+        self.html = html
+        self.latency = latency
+
+    def get(self, url, rate_limiter=None, key=None, validate=None):
+        time.sleep(self.latency)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = self.html.encode('utf-8')
+        response.encoding = 'utf-8'
+        return response
+
+    def invalidate(self, url):
+        pass
+
+
+def measure(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    with open(FIXTURE, encoding='utf-8') as fixture:
+        html = fixture.read()
+    params = (7, 8)
+
+    # оба способа должны давать одинаковый результат
+    expected = parse_with_soup(html, params)
+    tickers, ranks, values = FinvizParser().parse(html, params)
+    assert tickers == [row[0] for row in expected]
+    assert ranks.tolist() == [row[1] for row in expected]
+    assert np.allclose(values, [row[2] for row in expected], equal_nan=True)
+
+    soup_time = measure(lambda: parse_with_soup(html, params), args.repeat)
+    lxml_time = measure(lambda: FinvizParser().parse(html, params),
+                        args.repeat)
+    print('Страница {:.0f} КБ, {} строк'.format(len(html) / 1024,
+                                                len(tickers)))
+    print('BeautifulSoup: {:.2f} мс на страницу'.format(soup_time * 1000))
+    print('FinvizParser:  {:.2f} мс на страницу (в {:.1f} раз быстрее)'.format(
+        lxml_time * 1000, soup_time / lxml_time))
+
+    crawler = FinvizCrawler(min_interval=0,
+                            http_client=FakeHttpClient(html, args.latency))
+    start = time.perf_counter()
+    crawler.crawl_columns('pe', 1, {'pe': 7, 'price': 8})
+    elapsed = time.perf_counter() - start
+    pages = len(range(1, 8573, 20))
+    network = pages * args.latency / crawler.max_workers
+    print('Обход {} страниц: {:.2f} с (одна только сеть: {:.2f} с, '
+          'разбор: {:.2f} с)'.format(pages, elapsed, network,
+                                     pages * lxml_time))
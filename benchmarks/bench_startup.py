@@ -0,0 +1,75 @@
+# Замер времени запуска бота: импорт модулей и создание FinanceBot в новом
+# процессе интерпретатора, а также самые медленные при импорте модули.
+# Запуск: python -m benchmarks.bench_startup [--repeat N]
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STARTUP_CODE = '''
+import os
+import time
+start = time.perf_counter()
+from bot.finance_bot import FinanceBot
+imported = time.perf_counter()
+FinanceBot('123456:benchmark')
+created = time.perf_counter()
+print(imported - start, created - imported)
+os._exit(0)
+'''
+
+
+def run_python(code, directory, *flags):
+    env = dict(os.environ)
+    if not env.get('DATABASE_URL'):
+        env['DATABASE_URL'] = 'sqlite:///' + os.path.join(directory,
+                                                           'bench.db')
+    env['SNAPSHOT_CACHE_PATH'] = os.path.join(directory, 'snapshot.json')
+    return subprocess.run([sys.executable, *flags, '-c', code], cwd=ROOT,
+                          env=env, stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE, universal_newlines=True,
+                          check=True)
+
+
+def import_profile(directory, top):
+    """
+    Модули с наибольшим собственным временем импорта (python -X importtime)
+    """
+    result = run_python('import bot.finance_bot', directory, '-X',
+                        'importtime')
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_time, cumulative, name = line[len('import time:'):].split('|')
+        modules.append((int(self_time), int(cumulative), name.strip()))
+    return sorted(modules, reverse=True)[:top]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        import_times, init_times = [], []
+        for _ in range(args.repeat):
+            output = run_python(STARTUP_CODE, directory).stdout.split()
+            import_times.append(float(output[-2]))
+            init_times.append(float(output[-1]))
+
+        print('Импорт bot.finance_bot: {:.3f} с (медиана из {})'.format(
+            statistics.median(import_times), args.repeat))
+        print('Создание FinanceBot: {:.3f} с'.format(
+            statistics.median(init_times)))
+        print('\nСамые медленные модули (собственное время, мс):')
+        for self_time, cumulative, name in import_profile(directory,
+                                                          args.top):
+            print('{:>8.1f} {:>8.1f}  {}'.format(self_time / 1000,
+                                                 cumulative / 1000, name))
@@ -0,0 +1,168 @@
+# Подмены внешних сервисов для замеров без сети: HTTP-клиент, отдающий
+# сохранённые страницы finviz и ответы yahoo, и S3-клиент, хранящий объекты
+# в памяти
+
+import copy
+import io
+import json
+import os
+import re
+import time
+import typing as tp
+import zlib
+from urllib.parse import parse_qs, urlparse
+
+import botocore.exceptions
+import requests
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'fixtures')
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as fixture:
+        return fixture.read()
+
+
+class FixtureHttpClient:
+    """
+    Замена HttpClient. Страницы скринера собираются из сохранённых страниц
+    подстановкой тикеров из universe (для каждого вида таблицы свой
+    порядок), ответы yahoo - из сохранённого ответа с ценой и рейтингом,
+    зависящими от тикера
+    """
+    page_size = 20
+
+    def __init__(self, universe: tp.List[str],
+                 roe_universe: tp.Optional[tp.List[str]] = None,
+                 latency: float = 0.0):
+        self.latency = latency
+        self.requests = 0
+        self.pages = {
+            '111': self._render_pages(
+                read_fixture('finviz_screener_v111.html'), universe),
+            '161': self._render_pages(
+                read_fixture('finviz_screener_v161.html'),
+                roe_universe or universe)}
+        self.quote_summary = json.loads(
+            read_fixture('yahoo_quote_summary.json'))
+
+    def _render_pages(self, template: str, tickers: tp.List[str]) \
+            -> tp.Dict[int, bytes]:
+        rows = list(re.finditer(r'<tr valign="top".*?</tr>', template,
+                                re.S))
+        prefix = template[:rows[0].start()]
+        suffix = template[rows[-1].end():]
+        templates = []
+        for number, row in enumerate(rows, 1):
+            html = row.group(0)
+            ticker = re.search(r't=(.*?)&', html).group(1)
+            templates.append((html, str(number), ticker))
+
+        pages = dict()
+        for start in range(0, len(tickers), self.page_size):
+            page_rows = []
+            for k, ticker in enumerate(
+                    tickers[start:start + self.page_size]):
+                html, number, old_ticker = templates[k]
+                html = html.replace(f'>{number}</a>',
+                                    f'>{start + k + 1}</a>', 1)
+                html = html.replace(f'>{old_ticker}</a>', f'>{ticker}</a>')
+                html = html.replace(f't={old_ticker}&', f't={ticker}&')
+                page_rows.append(html)
+            pages[start + 1] = (prefix + '\n'.join(page_rows)
+                                + suffix).encode('utf-8')
+        return pages
+
+    def _quote_summary(self, ticker: str) -> bytes:
+        data = copy.deepcopy(self.quote_summary)
+        financial = data['quoteSummary']['result'][0]['financialData']
+        spread = zlib.crc32(ticker.encode()) % 1000 / 1000
+        financial['currentPrice']['raw'] *= 0.6 + 0.8 * spread
+        financial['recommendationMean']['raw'] = round(1 + 4 * spread, 1)
+        return json.dumps(data).encode('utf-8')
+
+    @staticmethod
+    def _make_response(url: str, status: int, body: bytes):
+        response = requests.Response()
+        response.status_code = status
+        response.url = url
+        response.encoding = 'utf-8'
+        response._content = body
+        response.from_cache = False
+        return response
+
+    def get(self, url: str, max_age: tp.Optional[float] = None,
+            rate_limiter=None, key=None,
+            validate=None) -> requests.Response:
+        if self.latency:
+            time.sleep(self.latency)
+        self.requests += 1
+        parsed = urlparse(url)
+        if parsed.netloc == 'finviz.com':
+            query = parse_qs(parsed.query)
+            body = self.pages[query['v'][0]].get(int(query['r'][0]))
+            if body is None:
+                # страницы за пределами списка тикеров пустые
+                body = self.pages[query['v'][0]][1].split(
+                    b'<tr valign="top"')[0] + b'</table></body></html>'
+            return self._make_response(url, 200, body)
+        ticker = parsed.path.rsplit('/', 1)[-1]
+        return self._make_response(url, 200, self._quote_summary(ticker))
+
+    def invalidate(self, url: str):
+        pass
+
+
+class MemoryS3Client:
+    """
+    S3-клиент, хранящий объекты в памяти. Реализует только методы,
+    которыми пользуется CloudManager (кроме download_many, которому
+    нужен настоящий s3transfer)
+    """
+    def __init__(self):
+        self.objects = dict()
+
+    @staticmethod
+    def _not_found(operation):
+        return botocore.exceptions.ClientError(
+            {'Error': {'Code': 'NoSuchKey', 'Message': 'Not Found'}},
+            operation)
+
+    def put_object(self, Bucket, Key, Body):
+        if hasattr(Body, 'read'):
+            Body = Body.read()
+        self.objects[(Bucket, Key)] = bytes(Body)
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise self._not_found('GetObject')
+        return {'Body': io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def upload_file(self, Filename, Bucket, Key):
+        with open(Filename, 'rb') as file:
+            self.put_object(Bucket, Key, file)
+
+    def download_file(self, Bucket, Key, Filename):
+        with open(Filename, 'wb') as file:
+            file.write(self.get_object(Bucket, Key)['Body'].read())
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+    def delete_objects(self, Bucket, Delete):
+        deleted = []
+        for item in Delete['Objects']:
+            self.delete_object(Bucket, item['Key'])
+            deleted.append({'Key': item['Key']})
+        return {'Deleted': deleted}
+
+    def get_paginator(self, operation):
+        return self
+
+    def paginate(self, Bucket, Prefix=''):
+        keys = sorted(key for bucket, key in self.objects
+                      if bucket == Bucket and key.startswith(Prefix))
+        for start in range(0, max(len(keys), 1), 1000):
+            yield {'Contents': [{'Key': key}
+                                for key in keys[start:start + 1000]]}
@@ -0,0 +1,283 @@
+# Замеры производительности этапов формирования рейтинга без сети: страницы
+# finviz и ответы yahoo берутся из benchmarks/fixtures, база - SQLite во
+# временном каталоге, облако - S3-клиент в памяти. Для каждого этапа
+# записываются время, пропускная способность и пиковая память, результаты
+# дописываются в benchmarks/results.jsonl вместе с хэшем коммита.
+# Запуск: python -m benchmarks.run [--repeat N] [--latency S]
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS = os.path.join(ROOT, 'benchmarks', 'results.jsonl')
+UNIVERSE_SIZE = 8572
+
+
+def configure_environment(directory):
+    """
+    Настройки указывают только на временный каталог, чтобы замеры никогда
+    не обращались к настоящей базе и облаку. Должно вызываться до импорта
+    settings
+    """
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directory,
+                                                              'bench.db')
+    os.environ['CLOUDCUBE_URL'] = 'https://cloud-cube.s3.amazonaws.com/bench'
+    os.environ['HTTP_CACHE_PATH'] = os.path.join(directory, 'http.sqlite')
+    os.environ['RANKING_ARCHIVE_PATH'] = os.path.join(directory, 'archive')
+    os.environ['INCREMENTAL_RANKING'] = '0'
+
+
+def get_commit():
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=ROOT,
+                              stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL,
+                              universal_newlines=True).stdout.strip()
+    commit = git('rev-parse', '--short', 'HEAD')
+    dirty = bool(git('status', '--porcelain', '--untracked-files=no'))
+    return commit, dirty
+
+
+def make_universe(white_list, seed=0):
+    """
+    Список тикеров скринера: все тикеры из белого списка и вымышленные
+    тикеры до полного размера, в разном порядке для P/E и ROE
+    """
+    rng = np.random.RandomState(seed)
+    tickers = list(dict.fromkeys(white_list))
+    tickers += ['ZZ{}'.format(i) for i in range(UNIVERSE_SIZE - len(tickers))]
+    return list(rng.permutation(tickers)), list(rng.permutation(tickers))
+
+
+def make_seed_ranking(tickers, columns, seed=0):
+    """
+    Вчерашний рейтинг, от которого отталкивается Analyzer
+    """
+    rng = np.random.RandomState(seed)
+    ranking = pd.DataFrame(rng.uniform(1, 100, (len(tickers), len(columns))),
+                           index=tickers, columns=columns)
+    return ranking.sort_values('Summary rang')
+
+
+@contextlib.contextmanager
+def quiet():
+    """
+    Прогресс-бары и сообщения этапов не нужны в выводе замеров
+    """
+    with contextlib.redirect_stdout(io.StringIO()), \
+            contextlib.redirect_stderr(io.StringIO()):
+        yield
+
+
+def build_analyzer(latency):
+    from sqlalchemy import create_engine
+
+    import settings
+    from analyzer.finance_analyzer import Analyzer
+    from assets import Portfolio
+    from benchmarks.fakes import FixtureHttpClient, MemoryS3Client
+    from rate_limiter import RateLimiter
+    from storage import CloudManager, DatabaseManager, RankingArchive
+
+    # одиночки создаются первыми, дальше все классы получают эти экземпляры
+    database_manager = DatabaseManager(
+        engine=create_engine(settings.DATABASE_URL))
+    database_manager.create_all()
+    CloudManager(s3_client=MemoryS3Client(), prefix='bench/')
+
+    white_list = Analyzer._get_white_list()
+    columns = ['E/P rang', 'E/P (%)', 'ROE rang', 'ROE (%)', 'Summary rang',
+               'Rating', 'Low Target', 'Current Price', 'Average Target',
+               'High Target']
+    RankingArchive().put(date.today() - timedelta(7),
+                         make_seed_ranking(white_list, columns))
+    Portfolio().save(settings.PORTFOLIO_FILENAME)
+
+    with quiet():
+        analyzer = Analyzer()
+    pe_universe, roe_universe = make_universe(white_list)
+    client = FixtureHttpClient(pe_universe, roe_universe, latency)
+    for fetcher in (analyzer.finviz_crawler, analyzer.yahoo_fetcher):
+        fetcher.http_client = client
+        fetcher.rate_limiter = RateLimiter(0)
+    return analyzer
+
+
+def get_stages(analyzer):
+    """
+    Этапы замеров: (название, функция от результатов предыдущих этапов,
+    количество обработанных элементов)
+    """
+    from analyzer.pipeline import RankingPipeline
+    from assets import Portfolio
+    from drawler import Drawler
+
+    pages = len(range(1, UNIVERSE_SIZE + 1, 20))
+
+    def portfolio_trades(context):
+        # покупки по 10 лотов на тикер и продажа части с разбиением лотов
+        portfolio = Portfolio()
+        portfolio.free_funds = portfolio.initial_funds = 1e12
+        tickers = context['ranking'].index[:200]
+        for lot in range(10):
+            for ticker in tickers:
+                portfolio.buy(ticker, 10, 1.0 + lot)
+        for ticker in tickers:
+            portfolio.sell(ticker, 55, 20.0)
+        return len(tickers) * 11
+
+    def draw_table(context):
+        companies = context['best'].reset_index()[
+            ['index', 'Rating', 'Current Price', 'Average Target']]
+        companies.columns = ['Тикер', 'Рейтинг', 'Цена', 'Цель']
+        colors_dict = {'#00083e': (0,), '#d9d9d9': (1, 3, 5),
+                       '#ffffff': (2, 4), '#d4f870': (), '#ff9273': ()}
+        for _ in range(10):
+            Drawler.draw_table(companies, colors_dict, height=400,
+                               width=1000)
+        return 10
+
+    def selection(context):
+        for _ in range(100):
+            context['best'] = analyzer._selection_function(
+                context['ranking'])
+        return 100
+
+    def set_result(key, function, items):
+        def stage(context):
+            context[key] = function(context)
+            return items(context)
+        return stage
+
+    return [
+        ('finviz_pe', set_result(
+            'pe', lambda c: analyzer._get_pe_ranks(), lambda c: pages)),
+        ('finviz_roe', set_result(
+            'roe', lambda c: analyzer._get_roe_ranks(), lambda c: pages)),
+        ('merge', set_result(
+            'merged', lambda c: analyzer._get_new_ranking(c['pe'], c['roe']),
+            lambda c: len(c['merged']))),
+        ('yahoo', set_result(
+            'estimation', lambda c: analyzer._get_estimation(
+                c['merged'].index.to_list()),
+            lambda c: len(c['estimation']))),
+        ('apply_estimation', set_result(
+            'ranking', lambda c: analyzer._apply_estimation(
+                c['merged'], c['estimation']),
+            lambda c: len(c['ranking']))),
+        ('database', set_result(
+            'saved', lambda c: analyzer._save_info_to_database(c['ranking']),
+            lambda c: len(c['ranking']))),
+        ('selection', selection),
+        ('portfolio_trades', portfolio_trades),
+        ('draw_table', draw_table),
+        ('pipeline', set_result(
+            'pipeline', lambda c: RankingPipeline(analyzer,
+                                                  date.today()).run(),
+            lambda c: 2 * pages + len(c['pipeline']))),
+    ]
+
+
+def run_stages(stages, repeat):
+    """
+    Время этапов (медиана из repeat прогонов) и пиковая память
+    (отдельный прогон под tracemalloc, чтобы не искажать время)
+    """
+    times = {name: [] for name, _ in stages}
+    items = dict()
+    for _ in range(repeat):
+        context = dict()
+        for name, stage in stages:
+            with quiet():
+                start = time.perf_counter()
+                items[name] = stage(context)
+                times[name].append(time.perf_counter() - start)
+
+    peaks = dict()
+    context = dict()
+    for name, stage in stages:
+        with quiet():
+            tracemalloc.start()
+            stage(context)
+            peaks[name] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    results = dict()
+    for name, _ in stages:
+        seconds = statistics.median(times[name])
+        results[name] = {'seconds': round(seconds, 6),
+                         'items': items[name],
+                         'per_second': round(items[name] / seconds, 2),
+                         'peak_mb': round(peaks[name] / 2 ** 20, 3)}
+    return results
+
+
+def load_previous(path, commit):
+    """
+    Последний сохранённый результат для другого коммита
+    """
+    if not os.path.exists(path):
+        return None
+    previous = None
+    with open(path, encoding='utf-8') as results_file:
+        for line in results_file:
+            entry = json.loads(line)
+            if entry['commit'] != commit:
+                previous = entry
+    return previous
+
+
+def print_results(results, previous):
+    header = '{:<18}{:>10}{:>11}{:>14}{:>13}'.format(
+        'этап', 'время, с', 'элементов', 'элементов/с', 'память, МБ')
+    if previous is not None:
+        header += '  к {}'.format(previous['commit'])
+    print(header)
+    for name, result in results.items():
+        line = '{:<18}{:>10.3f}{:>11}{:>14.1f}{:>13.1f}'.format(
+            name, result['seconds'], result['items'], result['per_second'],
+            result['peak_mb'])
+        old = previous['stages'].get(name) if previous is not None else None
+        if old is not None:
+            line += '  x{:.2f}'.format(result['seconds'] / old['seconds'])
+        print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='имитация сетевой задержки на запрос, с')
+    parser.add_argument('--output', default=RESULTS)
+    args = parser.parse_args()
+
+    commit, dirty = get_commit()
+    with tempfile.TemporaryDirectory() as directory:
+        configure_environment(directory)
+        sys.path.insert(0, ROOT)
+        os.chdir(ROOT)
+        analyzer = build_analyzer(args.latency)
+        results = run_stages(get_stages(analyzer), args.repeat)
+
+    entry = {'commit': commit, 'dirty': dirty,
+             'date': datetime.now().isoformat(timespec='seconds'),
+             'python': platform.python_version(), 'repeat': args.repeat,
+             'latency': args.latency, 'stages': results}
+    previous = load_previous(args.output, commit)
+    print_results(results, previous)
+    with open(args.output, 'a', encoding='utf-8') as results_file:
+        results_file.write(json.dumps(entry) + '\n')
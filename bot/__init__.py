@@ -1 +1,9 @@
-from bot.finance_bot import FinanceBot
+# Классы пакета загружаются при первом обращении
+from lazy_import import lazy_getattr
+
+_modules = {
+    'FinanceBot': 'bot.finance_bot'
+}
+__all__ = list(_modules)
+
+__getattr__ = lazy_getattr(__name__, _modules)
@@ -0,0 +1,81 @@
+# Хранилище готовых ответов бота. Карточки акций формируются один раз после
+# обновления таблицы shares_info, а признак подписки кэшируется для каждого
+# чата и обновляется при подписке и отписке
+
+import threading
+import typing as tp
+
+from storage import DatabaseManager
+
+
+class AnswerStore:
+    def __init__(self, database_manager: DatabaseManager):
+        self.database_manager = database_manager
+        self._lock = threading.Lock()
+        self._cards = dict()
+        self._cards_version = None
+        self._subscriptions = dict()
+
+    @staticmethod
+    def format_card(share_info: dict) -> str:
+        """
+        Формирование html-карточки с информацией об акции
+        """
+        ordered_info = (
+            share_info['company_name'], share_info['price'],
+            share_info['ep'], share_info['roe'], share_info['low_target'],
+            share_info['avg_target'], share_info['high_target'],
+            share_info['yahoo_rating'])
+        return '<b>Компания:</b> {}\n<b>Цена:</b> {}\n' \
+               '<b>E/P:</b> {:.2f}%\n<b>ROE:</b> {:.2f}%\n' \
+               '<b>Минимальный прогноз:</b> {}\n' \
+               '<b>Средний прогноз:</b> {}\n' \
+               '<b>Максимальный прогноз:</b> {}\n' \
+               '<b>Рейтинг YAHOO:</b> {}' \
+               ''.format(*ordered_info)
+
+    def rebuild(self) -> None:
+        """
+        Формирование карточек всех акций за один проход по таблице
+        """
+        # версия берётся вместе с данными: перечитывание таблицы её повышает
+        shares, version = \
+            self.database_manager.share_info_cache.get_all_with_version()
+        cards = {ticker: self.format_card(share_info)
+                 for ticker, share_info in shares.items()}
+        with self._lock:
+            self._cards = cards
+            self._cards_version = version
+
+    def needs_rebuild(self) -> bool:
+        return self._cards_version != \
+               self.database_manager.share_info_cache.version
+
+    def get_card(self, ticker: str) -> tp.Optional[str]:
+        """
+        Получение карточки акции. Если таблица shares_info изменилась,
+        карточки формируются заново
+        """
+        if self.needs_rebuild():
+            self.rebuild()
+        return self._cards.get(ticker)
+
+    def is_subscribed(self, chat_id: int) -> bool:
+        """
+        Подписан ли чат на рекомендации. База запрашивается только
+        при первом обращении
+        """
+        subscribed = self._subscriptions.get(chat_id)
+        if subscribed is None:
+            user = self.database_manager.get_subscriber_by_id(chat_id)
+            subscribed = bool(user is not None and user['recommendations'])
+            with self._lock:
+                self._subscriptions[chat_id] = subscribed
+        return subscribed
+
+    def get_cached_subscription(self, chat_id: int) -> tp.Optional[bool]:
+        return self._subscriptions.get(chat_id)
+
+    def set_subscription(self, chat_id: int, subscribed: bool) -> None:
+        with self._lock:
+            self._subscriptions[chat_id] = subscribed
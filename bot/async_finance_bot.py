@@ -0,0 +1,181 @@
+# Асинхронный вариант бота на основе AsyncTeleBot. Обработчики не блокируют
+# цикл событий: обращения к базе выполняются через asyncpg, а отрисовка
+# и пересборка карточек акций - в пуле потоков. Проверка результатов
+# анализатора и рассылки по-прежнему работают в потоке расписания FinanceBot
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import telebot
+from telebot.async_telebot import AsyncTeleBot
+
+from bot.finance_bot import FinanceBot
+from storage.async_database_manager import AsyncDatabaseManager
+
+
+class AsyncFinanceBot(AsyncTeleBot):
+    def __init__(self, token, max_workers=4):
+        super().__init__(token)
+        self.finance_bot = FinanceBot(token)
+        self.keyboard_buttons = self.finance_bot.keyboard_buttons
+        self.answer_store = self.finance_bot.answer_store
+        self.database_manager = AsyncDatabaseManager()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        # чаты, от которых ожидается тикер после команды /share_info
+        self._awaiting_ticker = set()
+        # последняя отправленная картинка с рейтингом и её file_id
+        self._ranking_photo = (None, None)
+        self._register_handlers()
+
+    async def run_in_executor(self, function, *args, **kwargs):
+        """
+        Выполнение блокирующей функции в пуле потоков
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(function, *args, **kwargs))
+
+    def _keyboard(self, buttons):
+        keyboard = telebot.types.InlineKeyboardMarkup()
+        for button_name in buttons:
+            keyboard.row(self.keyboard_buttons[button_name])
+        return keyboard
+
+    async def send_message(self, chat_id, text, buttons=(), **kwargs):
+        return await super().send_message(
+            chat_id, text, reply_markup=self._keyboard(buttons), **kwargs)
+
+    async def send_photo(self, chat_id, sent_img, text, buttons=(),
+                         **kwargs):
+        return await super().send_photo(
+            chat_id, sent_img, text, reply_markup=self._keyboard(buttons),
+            **kwargs)
+
+    async def is_subscribed(self, chat_id):
+        subscribed = self.answer_store.get_cached_subscription(chat_id)
+        if subscribed is None:
+            user = await self.database_manager.get_subscriber_by_id(chat_id)
+            subscribed = bool(user is not None and user['recommendations'])
+            self.answer_store.set_subscription(chat_id, subscribed)
+        return subscribed
+
+    async def get_card(self, ticker):
+        if self.answer_store.needs_rebuild():
+            await self.run_in_executor(self.answer_store.rebuild)
+        return self.answer_store.get_card(ticker)
+
+    async def send_ranking_snapshot(self, chat_id):
+        best = self.finance_bot.best_companies
+        if best is None:
+            await self.send_message(chat_id,
+                                    'Рекомендации ещё не сформированы',
+                                    ('get_share_info', 'help'))
+            return
+        photo = await self.run_in_executor(
+            self.finance_bot.get_recommendations_table, best, best)
+        cached_photo, file_id = self._ranking_photo
+        message = await self.send_photo(
+            chat_id, file_id if cached_photo == photo else photo,
+            'Текущие рекомендации советника', ('get_share_info', 'help'))
+        self._ranking_photo = (photo, message.photo[-1].file_id)
+
+    def _register_handlers(self):
+        @self.message_handler(commands=['start'])
+        async def start_message(message):
+            self._awaiting_ticker.discard(message.chat.id)
+            is_added = await self.database_manager.insert_subscriber(
+                message.chat.id, message.chat.first_name, message.chat.id,
+                True)
+            if not is_added:
+                await self.database_manager.subscribe_to_recommendations(
+                    message.chat.id)
+            self.answer_store.set_subscription(message.chat.id, True)
+            await self.send_message(
+                message.chat.id,
+                'Привет, ты подписался на мои инвестиционные рекомендации. '
+                'Чтобы посмотреть, что я умею, набери /help',
+                ('get_share_info', 'unsubscribe_recommends', 'help'))
+
+        @self.message_handler(commands=['help'])
+        async def help_command(message):
+            self._awaiting_ticker.discard(message.chat.id)
+            await self.send_message(
+                message.chat.id,
+                '<b>Список доступных команд:</b>\n\n'
+                '/share_info - запросить информацию об определённой акции;\n'
+                '/ranking - посмотреть текущие рекомендации;\n'
+                '/subscribe - подписаться на рекомендации;\n'
+                '/unsubscribe - отписаться от рекомендаций;\n'
+                '/help - посмотреть доступные команды.\n',
+                ('get_share_info', 'unsubscribe_recommends', 'help'),
+                parse_mode='HTML')
+
+        @self.message_handler(commands=['subscribe'])
+        async def subscribe_command(message):
+            self._awaiting_ticker.discard(message.chat.id)
+            await self.database_manager.subscribe_to_recommendations(
+                message.chat.id)
+            self.answer_store.set_subscription(message.chat.id, True)
+            await self.send_message(
+                message.chat.id,
+                'Ты подписался на инвестиционные рекомендации',
+                ('get_share_info', 'unsubscribe_recommends', 'help'))
+
+        @self.message_handler(commands=['unsubscribe'])
+        async def unsubscribe_command(message):
+            self._awaiting_ticker.discard(message.chat.id)
+            await self.database_manager.unsubscribe_from_recommendations(
+                message.chat.id)
+            self.answer_store.set_subscription(message.chat.id, False)
+            await self.send_message(
+                message.chat.id,
+                'Ты отписался от инвестиционных рекомендаций',
+                ('get_share_info', 'subscribe_recommends', 'help'))
+
+        @self.message_handler(commands=['share_info'])
+        async def share_info_command(message):
+            self._awaiting_ticker.add(message.chat.id)
+            await self.send_message(message.chat.id, 'Напиши тикер акции', ())
+
+        @self.message_handler(commands=['ranking'])
+        async def ranking_command(message):
+            self._awaiting_ticker.discard(message.chat.id)
+            await self.send_ranking_snapshot(message.chat.id)
+
+        @self.message_handler(
+            content_types=['text', 'sticker', 'photo', 'document', 'voice'],
+            func=lambda message: message.chat.id in self._awaiting_ticker)
+        async def get_share_info(message):
+            # стикер, фото и другие сообщения без текста
+            if message.text is None:
+                await self.send_message(message.chat.id,
+                                        'Напиши тикер акции текстом', ())
+                return
+
+            self._awaiting_ticker.discard(message.chat.id)
+            ticker = message.text.strip().upper()
+            answer_text = await self.get_card(ticker)
+            if answer_text is None:
+                answer_text = 'Тикер не найден. Я поддерживаю только акции, ' \
+                              'торгующиеся на Санкт-Петербуржской бирже'
+
+            if await self.is_subscribed(message.chat.id):
+                recommendations_key = 'unsubscribe_recommends'
+            else:
+                recommendations_key = 'subscribe_recommends'
+            await self.send_message(
+                message.chat.id, answer_text,
+                ('get_share_info', recommendations_key, 'help'),
+                parse_mode='HTML')
+
+        @self.callback_query_handler(func=lambda call: True)
+        async def query_handler(query):
+            callbacks = {'help': help_command,
+                         'subscribe_recommends': subscribe_command,
+                         'unsubscribe_recommends': unsubscribe_command,
+                         'get_share_info': share_info_command}
+            if query.data in callbacks:
+                await callbacks[query.data](query.message)
+            await self.answer_callback_query(query.id)
@@ -1,11 +1,22 @@
 # Этот файл определяет точку входа в приложение. В нём происходит запуск бота
+import asyncio
+
 import telebot
 
 import settings
 from bot.finance_bot import FinanceBot
 
-if __name__ == '__main__':
-    bot = FinanceBot(settings.TELEGRAM_API_TOKEN)
+if __name__ == '__main__' and settings.BOT_RUNTIME == 'async':
+    from bot.async_finance_bot import AsyncFinanceBot
+
+    async_bot = AsyncFinanceBot(settings.TELEGRAM_API_TOKEN)
+    asyncio.run(async_bot.infinity_polling())
+
+elif __name__ == '__main__':
+    # при приёме через webhook порядок и ограничение очередей обеспечивает
+    # WebhookServer, поэтому обработчики не передаются в пул потоков telebot
+    bot = FinanceBot(settings.TELEGRAM_API_TOKEN,
+                     threaded=settings.BOT_RUNTIME != 'webhook')
 
 
     @bot.message_handler(commands=['start'])
@@ -17,6 +28,7 @@ if __name__ == '__main__':
         if not is_added:
             bot.database_manager.subscribe_to_recommendations(
                 message.chat.id)
+        bot.answer_store.set_subscription(message.chat.id, True)
         bot.send_message(message.chat.id,
                          'Привет, ты подписался на мои инвестиционные рекомендации. '
                          'Чтобы посмотреть, что я умею, набери /help',
@@ -29,6 +41,7 @@ if __name__ == '__main__':
             message.chat.id,
             '<b>Список доступных команд:</b>\n\n'
             '/share_info - запросить информацию об определённой акции;\n'
+            '/ranking - посмотреть текущие рекомендации;\n'
             '/subscribe - подписаться на рекомендации;\n'
             '/unsubscribe - отписаться от рекомендаций;\n'
             '/help - посмотреть доступные команды.\n',
@@ -40,6 +53,7 @@ if __name__ == '__main__':
     def subscribe_command(message):
         bot.database_manager.subscribe_to_recommendations(
             message.chat.id)
+        bot.answer_store.set_subscription(message.chat.id, True)
         bot.send_message(
             message.chat.id,
             'Ты подписался на инвестиционные рекомендации',
@@ -51,6 +65,7 @@ if __name__ == '__main__':
     def unsubscribe_command(message):
         bot.database_manager.unsubscribe_from_recommendations(
             message.chat.id)
+        bot.answer_store.set_subscription(message.chat.id, False)
         bot.send_message(
             message.chat.id,
             'Ты отписался от инвестиционных рекомендаций',
@@ -69,29 +84,24 @@ if __name__ == '__main__':
 
 
     def get_share_info(message):
-        ticker = message.text.strip().upper()
-        share_info = bot.database_manager.get_share_info(ticker)
+        # стикер, фото и другие сообщения без текста
+        if message.text is None:
+            message = bot.send_message(
+                message.chat.id,
+                'Напиши тикер акции текстом',
+                ()
+            )
+            bot.register_next_step_handler(message, get_share_info)
+            return
 
-        if share_info is None:
+        ticker = message.text.strip().upper()
+        answer_text = bot.answer_store.get_card(ticker)
+        if answer_text is None:
             answer_text = 'Тикер не найден. Я поддерживаю только акции, ' \
                           'торгующиеся на Санкт-Петербуржской бирже'
-        else:
-            ordered_info = (
-                share_info['company_name'], share_info['price'],
-                share_info['ep'], share_info['roe'], share_info['low_target'],
-                share_info['avg_target'], share_info['high_target'],
-                share_info['yahoo_rating'])
-            answer_text = '<b>Компания:</b> {}\n<b>Цена:</b> {}\n' \
-                          '<b>E/P:</b> {:.2f}%\n<b>ROE:</b> {:.2f}%\n' \
-                          '<b>Минимальный прогноз:</b> {}\n' \
-                          '<b>Средний прогноз:</b> {}\n' \
-                          '<b>Максимальный прогноз:</b> {}\n' \
-                          '<b>Рейтинг YAHOO:</b> {}' \
-                          ''.format(*ordered_info)
 
         # subscribe_recommends/unsubscribe_recommends в зависимости от пользователя
-        user = bot.database_manager.get_subscriber_by_id(message.chat.id)
-        if user['recommendations']:
+        if bot.answer_store.is_subscribed(message.chat.id):
             recommendations_key = 'unsubscribe_recommends'
         else:
             recommendations_key = 'subscribe_recommends'
@@ -103,6 +113,11 @@ if __name__ == '__main__':
         )
 
 
+    @bot.message_handler(commands=['ranking'])
+    def ranking_command(message):
+        bot.send_ranking_snapshot(message.chat.id)
+
+
     def get_previous_version(message):
         chat_id = message.chat.id
         # bot.get_recommendations_table(None, None)
@@ -135,4 +150,10 @@ if __name__ == '__main__':
         bot.answer_callback_query(query.id)
 
 
-    bot.infinity_polling()
+    if settings.BOT_RUNTIME == 'webhook':
+        from bot.webhook_server import WebhookServer
+
+        server = WebhookServer(bot, '/' + settings.TELEGRAM_API_TOKEN)
+        server.run(settings.PORT, settings.WEBHOOK_URL)
+    else:
+        bot.infinity_polling()
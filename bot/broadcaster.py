@@ -0,0 +1,150 @@
+# Рассылка сообщений подписчикам пулом потоков с соблюдением ограничений
+# Telegram на общее число сообщений в секунду и на сообщения в один чат
+
+import statistics
+import threading
+import time
+import typing as tp
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import telebot
+
+from rate_limiter import RateLimiter
+
+
+class BroadcastReport:
+    def __init__(self):
+        self.messages = dict()
+        self.failed = []
+        self.latencies = []
+        self.elapsed = 0.0
+
+    @property
+    def sent(self) -> int:
+        return len(self.messages)
+
+    def __str__(self):
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            mean = statistics.mean(latencies)
+            p95 = latencies[int(0.95 * (len(latencies) - 1))]
+        else:
+            mean = p95 = 0.0
+        return f'Рассылка: доставлено {self.sent}, ошибок {len(self.failed)}, ' \
+               f'время {self.elapsed:.1f} с, задержка {mean:.3f} с ' \
+               f'(95%: {p95:.3f} с)'
+
+
+class Broadcaster:
+    def __init__(self, bot: telebot.TeleBot, max_workers: int = 8,
+                 messages_per_second: float = 25.0,
+                 chat_interval: float = 1.0, attempts: int = 3,
+                 backoff: float = 1.0):
+        self.bot = bot
+        self.max_workers = max_workers
+        self.attempts = attempts
+        self.backoff = backoff
+        self.global_limiter = RateLimiter(1.0 / messages_per_second)
+        self.chat_limiter = RateLimiter(chat_interval)
+
+    def _send(self, send: tp.Callable, chat_id: int) \
+            -> tp.Tuple[tp.Optional[telebot.types.Message], float]:
+        """
+        Отправка одного сообщения. При ответе 429 вся рассылка
+        приостанавливается на время, указанное Telegram в retry_after.
+        Сетевые ошибки (обрыв соединения, таймаут) повторяются для этого
+        чата с растущей задержкой, после всех попыток сообщение считается
+        недоставленным
+        """
+        for attempt in range(self.attempts):
+            self.global_limiter.acquire()
+            self.chat_limiter.acquire(chat_id)
+            start = time.monotonic()
+            try:
+                return send(chat_id), time.monotonic() - start
+            except telebot.apihelper.ApiTelegramException as e:
+                if e.error_code != 429:
+                    # например, пользователь заблокировал бота
+                    return None, time.monotonic() - start
+                retry_after = e.result_json.get('parameters', {}).get(
+                    'retry_after', 1)
+                self.global_limiter.defer(retry_after)
+            except telebot.apihelper.ApiException:
+                return None, time.monotonic() - start
+            except (requests.ConnectionError, requests.Timeout):
+                self.chat_limiter.defer(self.backoff * 2 ** attempt, chat_id)
+            except requests.RequestException:
+                return None, time.monotonic() - start
+        return None, 0.0
+
+    def broadcast(self, chat_ids: tp.Iterable[int], send: tp.Callable,
+                  report: tp.Optional[BroadcastReport] = None) \
+            -> BroadcastReport:
+        """
+        Вызов send(chat_id) для каждого чата. Чаты читаются из chat_ids
+        по мере отправки, поэтому их можно передавать генератором
+        """
+        if report is None:
+            report = BroadcastReport()
+        start = time.monotonic()
+        lock = threading.Lock()
+        in_flight = threading.BoundedSemaphore(self.max_workers * 4)
+
+        def task(chat_id):
+            try:
+                message, latency = self._send(send, chat_id)
+                with lock:
+                    if message is None:
+                        report.failed.append(chat_id)
+                    else:
+                        report.messages[chat_id] = message
+                        report.latencies.append(latency)
+            finally:
+                in_flight.release()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for chat_id in chat_ids:
+                in_flight.acquire()
+                executor.submit(task, chat_id)
+
+        report.elapsed += time.monotonic() - start
+        return report
+
+    def send_messages(self, chat_ids: tp.Iterable[int], text: str,
+                      buttons=(), **kwargs) -> BroadcastReport:
+        return self.broadcast(
+            chat_ids,
+            lambda chat_id: self.bot.send_message(chat_id, text, buttons,
+                                                  **kwargs))
+
+    def send_photos(self, chat_ids: tp.Iterable[int], photo: bytes, text: str,
+                    buttons=(), **kwargs) -> BroadcastReport:
+        """
+        Рассылка картинки. Картинка загружается в Telegram один раз,
+        остальным подписчикам отправляется её file_id
+        """
+        report = BroadcastReport()
+        chat_ids = iter(chat_ids)
+        start = time.monotonic()
+        file_id = None
+        for chat_id in chat_ids:
+            message, latency = self._send(
+                lambda chat: self.bot.send_photo(chat, photo, text, buttons,
+                                                 **kwargs), chat_id)
+            if message is None:
+                report.failed.append(chat_id)
+                continue
+            report.messages[chat_id] = message
+            report.latencies.append(latency)
+            file_id = message.photo[-1].file_id
+            break
+        report.elapsed += time.monotonic() - start
+
+        if file_id is None:
+            return report
+        return self.broadcast(
+            chat_ids,
+            lambda chat_id: self.bot.send_photo(chat_id, file_id, text,
+                                                buttons, **kwargs),
+            report)
@@ -0,0 +1,109 @@
+# Планировщик доставки рекомендаций. Подписчики группируются по времени
+# получения рекомендаций (User.recommendations_time), и рассылка для каждой
+# группы ставится в ScheduleThread на время её слота. Задачи ScheduleThread
+# живут только в памяти, поэтому доставка каждой публикации отмечается
+# в базе (таблица deliveries), а после перезапуска бота рассылка ставится
+# заново только для недоставленных чатов
+
+import typing as tp
+from datetime import datetime, time, timedelta, timezone
+
+from schedule_thread import ScheduleThread
+from storage import DatabaseManager
+
+
+class DeliveryScheduler:
+    def __init__(self, schedule_thread: ScheduleThread,
+                 database_manager: DatabaseManager, bucket_minutes: int = 15,
+                 chunk_size: int = 500):
+        self.schedule_thread = schedule_thread
+        self.database_manager = database_manager
+        self.bucket = timedelta(minutes=bucket_minutes)
+        # доставка отмечается в базе после каждых chunk_size чатов
+        self.chunk_size = chunk_size
+
+    def _get_slots(self) -> tp.List[tp.Tuple[time, tp.Optional[time]]]:
+        """
+        Получение слотов [start, end) по временам получения рекомендаций
+        """
+        bucket_minutes = int(self.bucket.total_seconds() // 60)
+        starts = set()
+        for value in self.database_manager.get_recommendations_times():
+            if value is None:
+                # подписчики без времени получают рекомендации в то же
+                # время, что и по умолчанию (см. iter_subscribers)
+                value = self.database_manager.default_recommendations_time
+            minute = value.hour * 60 + value.minute
+            minute -= minute % bucket_minutes
+            starts.add(time(minute // 60, minute % 60, tzinfo=value.tzinfo))
+
+        slots = []
+        for start in sorted(starts, key=lambda value: (value.hour,
+                                                       value.minute)):
+            end = (datetime.combine(datetime.today(), start)
+                   + self.bucket).timetz()
+            # последний слот суток не переходит через полночь
+            slots.append((start, end if end > start else None))
+        return slots
+
+    @staticmethod
+    def _next_run_date(start: time,
+                       since: tp.Optional[datetime] = None) -> datetime:
+        """
+        Ближайшее время слота после since (по умолчанию - после текущего
+        момента)
+        """
+        if since is None:
+            since = datetime.now(start.tzinfo)
+        else:
+            # время без часового пояса (например, из SQLite) считается UTC
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+            since = since.astimezone(start.tzinfo) \
+                if start.tzinfo is not None \
+                else since.astimezone().replace(tzinfo=None)
+        run_date = datetime.combine(since.date(), start)
+        if run_date <= since:
+            run_date += timedelta(1)
+        return run_date
+
+    def schedule(self, name: str,
+                 deliver: tp.Callable[[tp.List[int]], tp.Any],
+                 publication_id: tp.Optional[int] = None,
+                 since: tp.Optional[datetime] = None) -> int:
+        """
+        Постановка рассылки в очередь по слотам. В момент слота deliver
+        вызывается с чатами подписчиков этого слота и должен вернуть
+        BroadcastReport. Ещё не выполненная рассылка с тем же именем
+        заменяется новой. Если задан publication_id, рассылку получают только
+        чаты, которым эта публикация ещё не доставлена. Если задан since
+        (время появления публикации), слоты, которые уже прошли после
+        since, выполняются сразу - так продолжается прерванная рассылка.
+        Возвращает количество слотов
+        """
+        slots = self._get_slots()
+        for start, end in slots:
+            run_date = self._next_run_date(start, since)
+            run_date = max(run_date, datetime.now(run_date.tzinfo))
+            self.schedule_thread.add_job(
+                self._deliver, 'date', run_date=run_date,
+                args=(deliver, start, end, publication_id),
+                id=f'{name}_{start.hour:02d}{start.minute:02d}',
+                replace_existing=True, misfire_grace_time=3600)
+        return len(slots)
+
+    def _deliver(self, deliver: tp.Callable[[tp.List[int]], tp.Any],
+                 start: time, end: tp.Optional[time],
+                 publication_id: tp.Optional[int] = None) -> None:
+        # чаты читаются заранее, чтобы не держать открытым курсор по таблице,
+        # в которую записывается доставка
+        chats = [subscriber['chat_id'] for subscriber
+                 in self.database_manager.iter_subscribers(
+                     start_time=start, end_time=end,
+                     undelivered=publication_id)]
+        for first in range(0, len(chats), self.chunk_size):
+            report = deliver(chats[first:first + self.chunk_size])
+            if publication_id is not None:
+                self.database_manager.mark_delivered(report.messages,
+                                                     publication_id)
+            print(f'Рассылка для слота {start}:', report)
@@ -1,25 +1,38 @@
 # Основной класс бота, запускаемого в bot_worker.py
+# Тяжёлые модули (pandas, Pillow, boto3) импортируются при первом
+# использовании, а обращения к базе при запуске выполняются в фоне
 import calendar
-import os
-from datetime import date
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
 
-import pandas as pd
 import telebot
 from telebot.types import InlineKeyboardButton
 
-from analyzer import Analyzer
-from drawler import Drawler
+from bot.answer_store import AnswerStore
+from bot.broadcaster import Broadcaster
+from bot.delivery_scheduler import DeliveryScheduler
+from bot.snapshot_cache import SnapshotCache
 from schedule_thread import ScheduleThread
-from settings import MONTH_NAMES
+from settings import MONTH_NAMES, PORTFOLIO_FILENAME
 from storage import DatabaseManager
 
 
 class FinanceBot(telebot.TeleBot):
-    def __init__(self, token):
-        super().__init__(token)
+    def __init__(self, token, threaded=True):
+        # threaded=False - обработчики вызываются в потоке, передавшем
+        # обновления (нужно при приёме через webhook, см. webhook_server.py)
+        super().__init__(token, threaded=threaded)
         self.database_manager = DatabaseManager()
-        self.analyzer = Analyzer()
-        self.portfolio = self.analyzer.portfolio
+
+        # бот только читает результаты, опубликованные процессом анализатора
+        # (см. analyzer/analyzer_worker.py). До ответа базы используется
+        # локальный снимок последней публикации
+        self.snapshot_cache = SnapshotCache()
+        snapshot = self.snapshot_cache.load() or {}
+        self._publication_id = snapshot.get('id')
+        self._best_companies_json = snapshot.get('best_companies')
+        self._best_companies = None
 
         # кнопки умной клавиатуры
         self._buttons_info = {
@@ -36,21 +49,89 @@ class FinanceBot(telebot.TeleBot):
                                                                    callback_data=callback)
 
         self.last_recommendations = dict()
+        self.broadcaster = Broadcaster(self)
+        self.answer_store = AnswerStore(self.database_manager)
+        # последняя отправленная картинка с рейтингом и её file_id
+        self._ranking_photo = (None, None)
 
         # отдельный поток, отвечающий за отправку изменения рекомендаций и
         # ежемесячной прибыльности портфеля
         self.reg_thread = ScheduleThread()
-        self.reg_thread.add_job(self.update_recommendations, 'cron',
-                                day_of_week='mon-fri', hour=21, minute=0)
+        self.reg_thread.add_job(self.update_recommendations, 'interval',
+                                minutes=1)
         self.reg_thread.add_job(self.send_profitability, 'cron',
                                 day='1', hour=18, minute=0)
+
+        # рассылка рекомендаций каждому подписчику в выбранное им время
+        self.delivery_scheduler = DeliveryScheduler(self.reg_thread,
+                                                    self.database_manager)
+        threading.Thread(target=self._warm_up, daemon=True).start()
+
+    def _warm_up(self, max_delay=300):
+        """
+        Подготовка базы и кэшей после запуска. Выполняется в фоне, чтобы
+        бот начал опрашивать Telegram как можно раньше. Пока база
+        недоступна, попытки повторяются с растущей задержкой, после чего
+        запускается поток рассылок
+        """
+        delay = 5
+        while True:
+            try:
+                self.database_manager.create_all()
+                self.database_manager.create_indexes()
+                # публикации, появившиеся, пока бот не работал, сравниваются
+                # с последней известной боту. Без снимка (или если новых
+                # публикаций нет) продолжается рассылка последней публикации
+                has_snapshot = self._publication_id is not None
+                if self._update_publication(notify=has_snapshot) is None \
+                        or not has_snapshot:
+                    self._resume_delivery()
+                self.answer_store.rebuild()
+                break
+            except Exception as e:
+                print(f'Ошибка подготовки бота: {e}. '
+                      f'Повтор через {delay} с')
+                time.sleep(delay)
+                delay = min(2 * delay, max_delay)
         self.reg_thread.start()
 
+    def _resume_delivery(self, max_age=timedelta(1)):
+        """
+        Продолжение рассылки последней публикации, прерванной перезапуском.
+        Рекомендации получат только чаты, которым публикация ещё не
+        доставлена. Публикации старше max_age не рассылаются
+        """
+        publication = self.database_manager.get_latest_publication()
+        if publication is None or publication['created_at'] is None:
+            return
+        created_at = publication['created_at']
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        if datetime.now(timezone.utc) - created_at > max_age:
+            return
+        prev_best = publication['prev_best_companies']
+        cur_best = publication['best_companies']
+        if set(prev_best.index) != set(cur_best.index):
+            self.send_recommendations(cur_best, prev_best, publication['id'],
+                                      publication['created_at'])
+
+    @property
+    def best_companies(self):
+        if self._best_companies is None \
+                and self._best_companies_json is not None:
+            self._best_companies = DatabaseManager.companies_from_json(
+                self._best_companies_json)
+        return self._best_companies
+
     @staticmethod
     def get_recommendations_table(companies, prev_companies):
         """
-        Формирование картинки с рекомендованными акциями
+        Формирование картинки с рекомендованными акциями в формате png
         """
+        import pandas as pd
+
+        from drawler import Drawler
+
         companies_df = companies.reset_index()[
             ['index', 'Rating', 'Current Price', 'Average Target']]
         prev_companies_df = prev_companies.reset_index()[
@@ -71,19 +152,68 @@ class FinanceBot(telebot.TeleBot):
                        '#ff9273': ()
                        }
 
-        image = Drawler.draw_table(table=companies_df, colors_dict=colors_dict,
-                                   width=1000, height=400)
-        image.save('companies_table.png')
+        return Drawler.render_table_png(table=companies_df,
+                                        colors_dict=colors_dict,
+                                        width=1000, height=400)
+
+    def _get_subscribed_chats(self):
+        """
+        Получение чатов подписчиков рекомендаций
+        """
+        return (subscriber['chat_id']
+                for subscriber in self.database_manager.iter_subscribers())
+
+    def _update_publication(self, notify=True):
+        """
+        Проверка новых результатов анализатора и постановка в очередь
+        рассылки рекомендаций подписчикам, если рекомендации изменились.
+        Новые рекомендации сравниваются с последними известными боту, так что
+        пропущенные промежуточные публикации не теряются.
+        Возвращает новую публикацию или None
+        """
+        publication = self.database_manager.get_latest_publication(
+            self._publication_id)
+        if publication is None:
+            return None
+        prev_best = self.best_companies
+        if prev_best is None:
+            prev_best = publication['prev_best_companies']
+        cur_best = publication['best_companies']
+        self._publication_id = publication['id']
+        self._best_companies = cur_best
+        self._best_companies_json = \
+            DatabaseManager.companies_to_json(cur_best)
+        self.snapshot_cache.save(self._publication_id,
+                                 self._best_companies_json)
+
+        # таблица shares_info обновлена другим процессом
+        self.database_manager.share_info_cache.invalidate()
+        self.answer_store.rebuild()
+        if notify and set(prev_best.index) != set(cur_best.index):
+            self.send_recommendations(cur_best, prev_best, publication['id'],
+                                      publication['created_at'])
+        return publication
 
     def update_recommendations(self):
+        self._update_publication()
+
+    def send_ranking_snapshot(self, chat_id):
         """
-        Запуск анализатора и отправка рекомендаций подписчикам,
-        если рекомендации изменились
+        Отправка картинки с текущими рекомендациями. Картинка отрисовывается
+        один раз и загружается в Telegram один раз до смены рекомендаций
         """
-        prev_best = self.analyzer.best_companies
-        cur_best = self.analyzer.get_best_companies()
-        if set(prev_best.index) != set(cur_best.index):
-            self.send_recommendations(cur_best, prev_best)
+        best = self.best_companies
+        if best is None:
+            self.send_message(chat_id, 'Рекомендации ещё не сформированы',
+                              ('get_share_info', 'help'))
+            return
+        photo = self.get_recommendations_table(best, best)
+        cached_photo, file_id = self._ranking_photo
+        message = self.send_photo(chat_id,
+                                  file_id if cached_photo == photo else photo,
+                                  'Текущие рекомендации советника',
+                                  ('get_share_info', 'help'))
+        self._ranking_photo = (photo, message.photo[-1].file_id)
 
     def send_profitability(self):
         """
@@ -95,8 +225,12 @@ class FinanceBot(telebot.TeleBot):
         last_day = calendar.monthrange(prev_prev_year, prev_prev_month)[1]
         prev_date = date(prev_prev_year, prev_prev_month, last_day)
 
-        profit = self.portfolio.get_total_profitability()
-        month_profit = self.portfolio.get_range_profitability(first=prev_date)
+        from assets import Portfolio
+
+        # портфель ведёт процесс анализатора, берём его последнюю версию
+        portfolio = Portfolio(PORTFOLIO_FILENAME)
+        profit = portfolio.get_total_profitability()
+        month_profit = portfolio.get_range_profitability(first=prev_date)
 
         month_name = MONTH_NAMES[(today.month + 10) % 12]  # индексация с нуля
         text = '**Результаты работы советника:**\n\n' \
@@ -104,33 +238,34 @@ class FinanceBot(telebot.TeleBot):
                '**Прибыльность за {}:** {:.2f}%'.format(profit * 100,
                                                         month_name,
                                                         month_profit * 100)
-        subscribers = self.database_manager.get_subscribers()
-        for subscriber in subscribers:
-            if subscriber['recommendations']:
-                self.send_message(subscriber['chat_id'], text, (),
-                                  parse_mode='Markdown')
+        report = self.broadcaster.send_messages(self._get_subscribed_chats(),
+                                                text, parse_mode='Markdown')
+        print(report)
 
-    def send_recommendations(self, best_companies, prev_best_companies):
+    def send_recommendations(self, best_companies, prev_best_companies,
+                             publication_id=None, since=None):
         """
-        Добавление умной клавиатуры к сообщению и вызов метода базового класса.
-        Используется для отправки рекомендаций
+        Постановка рассылки картинки с рекомендациями в очередь по времени
+        получения рекомендаций подписчиками. Картинка отрисовывается при
+        первой отправке и загружается в Telegram один раз, доставка
+        публикации publication_id отмечается в базе
         """
-        self.get_recommendations_table(best_companies, prev_best_companies)
-        text = 'Список самых недооценённых акций на ' \
-               'Санкт-Петербуржской бирже на сегодняшний ' \
-               'день'
         text = 'Изменения в портфеле советника'
-        subscribers = self.database_manager.get_subscribers()
-        for subscriber in subscribers:
-            if subscriber['recommendations']:
-                try:
-                    with open('companies_table.png', 'rb') as sent_img:
-                        self.last_recommendations[subscriber['chat_id']] = \
-                            self.send_photo(subscriber['chat_id'], sent_img,
-                                            text) #, ('get_previous_version',))
-                except telebot.apihelper.ApiException:
-                    pass
-        os.remove('companies_table.png')
+        photo = []
+
+        def deliver(chats):
+            if not photo:
+                photo.append(self.get_recommendations_table(
+                    best_companies, prev_best_companies))
+            report = self.broadcaster.send_photos(chats, photo[-1], text)
+            if report.messages:
+                message = next(iter(report.messages.values()))
+                photo.append(message.photo[-1].file_id)
+            self.last_recommendations.update(report.messages)
+            return report
+
+        self.delivery_scheduler.schedule('recommendations', deliver,
+                                         publication_id, since)
 
     def send_message(self, chat_id, text, buttons=(), **kwargs):
         """
@@ -0,0 +1,36 @@
+# Локальный снимок последней публикации анализатора. Позволяет боту начать
+# отвечать сразу после запуска, не дожидаясь ответа базы данных
+
+import json
+import os
+import typing as tp
+
+import settings
+
+
+class SnapshotCache:
+    def __init__(self, path: tp.Optional[str] = None):
+        if path is None:
+            path = settings.SNAPSHOT_CACHE_PATH
+        self.path = path
+
+    def load(self) -> tp.Optional[dict]:
+        """
+        Чтение снимка. Лучшие компании хранятся в виде json-строки
+        (DatabaseManager.companies_to_json)
+        """
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as snapshot_file:
+                return json.load(snapshot_file)
+        except ValueError:
+            print(f'Снимок {self.path} повреждён')
+            return None
+
+    def save(self, publication_id: int, best_companies: str) -> None:
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as snapshot_file:
+            json.dump({'id': publication_id,
+                       'best_companies': best_companies}, snapshot_file)
+        os.replace(tmp_path, self.path)
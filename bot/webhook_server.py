@@ -0,0 +1,97 @@
+# Приём обновлений Telegram через webhook. Обновления складываются в
+# ограниченные очереди и обрабатываются пулом потоков обработчиками бота.
+# Обновления одного чата попадают в одну очередь, поэтому обрабатываются
+# по порядку. При переполнении очереди сервер отвечает 429, и Telegram
+# повторяет доставку позже. Бот должен быть создан с threaded=False, иначе
+# telebot передаст обработчики в свой пул потоков и очереди перестанут
+# ограничивать нагрузку и сохранять порядок
+
+import asyncio
+import typing as tp
+from concurrent.futures import ThreadPoolExecutor
+
+import telebot
+from aiohttp import web
+
+
+class WebhookServer:
+    def __init__(self, bot: telebot.TeleBot, path: str, workers: int = 8,
+                 queue_size: int = 256):
+        if bot.threaded:
+            raise ValueError('WebhookServer требует бота с threaded=False')
+        self.bot = bot
+        self.path = path
+        self.workers = workers
+        self.queue_size = queue_size
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self._queues = []
+        self._tasks = []
+
+    @staticmethod
+    def _get_chat_id(update: telebot.types.Update) -> int:
+        if update.message is not None:
+            return update.message.chat.id
+        if update.callback_query is not None \
+                and update.callback_query.message is not None:
+            return update.callback_query.message.chat.id
+        return 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """
+        Приём одного обновления. Ответ отправляется сразу после постановки
+        обновления в очередь
+        """
+        try:
+            update = telebot.types.Update.de_json(await request.text())
+        except ValueError:
+            return web.Response(status=400)
+
+        queue = self._queues[self._get_chat_id(update) % self.workers]
+        try:
+            queue.put_nowait(update)
+        except asyncio.QueueFull:
+            return web.Response(status=429, headers={'Retry-After': '1'})
+        return web.Response()
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            update = await queue.get()
+            try:
+                await loop.run_in_executor(self.executor,
+                                           self.bot.process_new_updates,
+                                           [update])
+            except Exception as e:
+                print(f'Ошибка обработки обновления {update.update_id}: {e}')
+            finally:
+                queue.task_done()
+
+    async def _start_workers(self, app: web.Application) -> None:
+        self._queues = [asyncio.Queue(maxsize=self.queue_size)
+                        for _ in range(self.workers)]
+        self._tasks = [asyncio.ensure_future(self._worker(queue))
+                       for queue in self._queues]
+
+    async def _stop_workers(self, app: web.Application) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.executor.shutdown(wait=True)
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        app.on_startup.append(self._start_workers)
+        app.on_cleanup.append(self._stop_workers)
+        return app
+
+    def run(self, port: int, webhook_url: tp.Optional[str] = None,
+            host: str = '0.0.0.0') -> None:
+        """
+        Запуск сервера. Если webhook_url не указан, webhook в Telegram
+        не регистрируется (например, при локальной отладке)
+        """
+        if webhook_url is not None:
+            self.bot.remove_webhook()
+            self.bot.set_webhook(url=webhook_url.rstrip('/') + self.path)
+        web.run_app(self.make_app(), host=host, port=port)
@@ -1 +1,9 @@
-from drawler.drawler import Drawler
+# Классы пакета загружаются при первом обращении
+from lazy_import import lazy_getattr
+
+_modules = {
+    'Drawler': 'drawler.drawler'
+}
+__all__ = list(_modules)
+
+__getattr__ = lazy_getattr(__name__, _modules)
@@ -1,20 +1,39 @@
 # Класс отвечающий за создание изображений
+import functools
+import hashlib
+import io
 import os
+import threading
 import typing as tp
+from collections import OrderedDict
 
 import pandas as pd
 from PIL import Image, ImageDraw, ImageFont
 
 
 class Drawler:
+    # готовые png-изображения по хэшу содержимого таблицы и цветов
+    _png_cache = OrderedDict()
+    # изображения отрисовываются из нескольких потоков бота
+    _png_cache_lock = threading.Lock()
+    png_cache_size = 32
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _font(size: int = 32) -> ImageFont.FreeTypeFont:
+        """
+        Загрузка шрифта с диска (один раз для каждого размера)
+        """
+        return ImageFont.truetype(os.path.join('resources', 'arial.ttf'), size)
+
     @staticmethod
+    @functools.lru_cache(maxsize=4096)
     def _text_size(text, text_font) -> (int, int):
         """
         Вычисляет размер рамки с текстом
         """
-        width = text_font.getmask(text).getbbox()[2]
-        height = text_font.getmask(text).getbbox()[3]
-        return height, width
+        bbox = text_font.getmask(text).getbbox()
+        return bbox[3], bbox[2]
 
     @staticmethod
     def draw_table(table: pd.DataFrame,
@@ -27,7 +46,7 @@ class Drawler:
         """
         image = Image.new('RGBA', (width - 1, height - 1), (255, 255, 255, 255))
         draw = ImageDraw.Draw(image)
-        font = ImageFont.truetype(os.path.join('resources', 'arial.ttf'), 32)
+        font = Drawler._font(32)
 
         color_by_row = dict()
         for color, rows in colors_dict.items():
@@ -37,15 +56,21 @@ class Drawler:
         rows_count, columns_count = table.shape
         cell_height = height / (rows_count + 1)
         cell_width = width / columns_count
+        for row in range(rows_count + 1):
+            # фон строки рисуется целиком, промежутки между ячейками
+            # закрашиваются ниже
+            draw.rectangle((0, row * cell_height,
+                            columns_count * cell_width - 2,
+                            (row + 1) * cell_height - 2),
+                           fill=color_by_row[row])
+
+        for column in range(1, columns_count):
+            x = column * cell_width - 1
+            draw.rectangle((x, 0, x, height), fill=(255, 255, 255, 255))
+
         for row in range(rows_count + 1):
             font_color = '#ffffff' if row == 0 else '#000000'
             for column in range(columns_count):
-                draw.rectangle((column * cell_width,
-                                row * cell_height,
-                                (column + 1) * cell_width - 2,
-                                (row + 1) * cell_height - 2),
-                               fill=color_by_row[row])
-
                 if row == 0:
                     text = table.columns[column]
                 else:
@@ -57,3 +82,30 @@ class Drawler:
                 draw.text((x, y), text, font=font, fill=font_color)
 
         return image
+
+    @staticmethod
+    def render_table_png(table: pd.DataFrame,
+                         colors_dict: tp.Dict[str, tp.Tuple[int]],
+                         height: int,
+                         width: int) -> bytes:
+        """
+        Изображение таблицы в формате png. Одинаковые таблицы
+        не отрисовываются и не кодируются повторно
+        """
+        key = hashlib.sha256(repr((table.to_csv(), sorted(colors_dict.items()),
+                                   height, width)).encode('utf-8')).hexdigest()
+        with Drawler._png_cache_lock:
+            if key in Drawler._png_cache:
+                Drawler._png_cache.move_to_end(key)
+                return Drawler._png_cache[key]
+
+        image = Drawler.draw_table(table, colors_dict, height, width)
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        png = buffer.getvalue()
+
+        with Drawler._png_cache_lock:
+            Drawler._png_cache[key] = png
+            if len(Drawler._png_cache) > Drawler.png_cache_size:
+                Drawler._png_cache.popitem(last=False)
+        return png
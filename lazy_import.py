@@ -0,0 +1,26 @@
+# Отложенный импорт классов пакета: модуль с классом загружается при первом
+# обращении к нему, чтобы импорт пакета не тянул за собой тяжёлые
+# зависимости (pandas, boto3, SQLAlchemy)
+
+import importlib
+import sys
+import typing as tp
+
+
+def lazy_getattr(package: str, modules: tp.Dict[str, str]) \
+        -> tp.Callable[[str], tp.Any]:
+    """
+    Функция __getattr__ для модуля пакета package (PEP 562). modules -
+    соответствие имени класса и модуля, в котором он определён.
+    Загруженный класс сохраняется в пакете, и следующие обращения
+    к нему идут в обход __getattr__
+    """
+    def __getattr__(name):
+        if name not in modules:
+            raise AttributeError(
+                f'module {package!r} has no attribute {name!r}')
+        value = getattr(importlib.import_module(modules[name]), name)
+        setattr(sys.modules[package], name, value)
+        return value
+
+    return __getattr__
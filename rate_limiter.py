@@ -0,0 +1,34 @@
+# Ограничитель частоты запросов к внешним сервисам. Потокобезопасен, поэтому
+# один экземпляр можно разделять между несколькими рабочими потоками
+
+import threading
+import time
+
+
+class RateLimiter:
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_time = dict()
+
+    def acquire(self, key=None) -> None:
+        """
+        Блокирует поток до тех пор, пока по ключу key (например, хосту)
+        не будет разрешён очередной запрос
+        """
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_time.get(key, now))
+            self._next_time[key] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def defer(self, delay: float, key=None) -> None:
+        """
+        Запрет запросов по ключу key на delay секунд, например, после
+        ответа сервиса "слишком много запросов"
+        """
+        with self._lock:
+            next_time = time.monotonic() + delay
+            self._next_time[key] = max(self._next_time.get(key, 0.0),
+                                       next_time)
@@ -9,7 +9,15 @@ CLOUDCUBE_URL = os.getenv('CLOUDCUBE_URL')
 DATABASE_URL = os.getenv('DATABASE_URL').replace('postgres://', 'postgresql://')
 CHROMEDRIVER_PATH = os.getenv('CHROMEDRIVER_PATH')
 GOOGLE_CHROME_BIN = os.getenv('GOOGLE_CHROME_BIN')
+BOT_RUNTIME = os.getenv('BOT_RUNTIME', 'polling')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+PORT = int(os.getenv('PORT', '8443'))
+RANKING_ARCHIVE_PATH = os.getenv('RANKING_ARCHIVE_PATH', 'ranking_archive')
+SNAPSHOT_CACHE_PATH = os.getenv('SNAPSHOT_CACHE_PATH', 'bot_snapshot.json')
+HTTP_CACHE_PATH = os.getenv('HTTP_CACHE_PATH', 'http_cache.sqlite')
+INCREMENTAL_RANKING = os.getenv('INCREMENTAL_RANKING', '0') == '1'
 
+PORTFOLIO_FILENAME = 'portfolio_v1.json'
 PROFIT_TAX = 0.13
 MONTH_NAMES = ('январь', 'февраль', 'март', 'апрель', 'май', 'июнь', 'июль',
                'август', 'сентябрь', 'октябрь', 'ноябрь', 'декабрь')
@@ -1,2 +1,12 @@
-from storage.cloud_manager import CloudManager
-from storage.database_manager import DatabaseManager
+# Классы пакета загружаются при первом обращении, чтобы импорт пакета
+# не тянул за собой boto3, pandas и SQLAlchemy
+from lazy_import import lazy_getattr
+
+_modules = {
+    'CloudManager': 'storage.cloud_manager',
+    'DatabaseManager': 'storage.database_manager',
+    'RankingArchive': 'storage.ranking_archive'
+}
+__all__ = list(_modules)
+
+__getattr__ = lazy_getattr(__name__, _modules)
@@ -0,0 +1,56 @@
+# Асинхронный менеджер базы данных для обработчиков AsyncFinanceBot.
+# Использует SQLAlchemy в асинхронном режиме с драйвером asyncpg
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+import settings
+from storage.models import User
+from storage.singleton import SingletonMeta
+
+
+class AsyncDatabaseManager(metaclass=SingletonMeta):
+    def __init__(self, engine=None):
+        if engine is None:
+            engine = create_async_engine(settings.DATABASE_URL.replace(
+                'postgresql://', 'postgresql+asyncpg://', 1))
+        self.engine = engine
+
+    async def insert_subscriber(self, subscriber_id, subscriber_name, chat_id,
+                                is_subscribe_recommends=True):
+        async with AsyncSession(self.engine) as session:
+            try:
+                session.add(User(subscriber_id, subscriber_name, chat_id,
+                                 is_subscribe_recommends))
+                await session.commit()
+            except IntegrityError:
+                print(f'Подписчик {subscriber_id} уже есть в таблице')
+                await session.rollback()
+                return False
+        return True
+
+    async def _set_recommendations(self, subscriber_id, value):
+        async with AsyncSession(self.engine) as session:
+            result = await session.execute(
+                update(User).where(User.user_id == subscriber_id)
+                .values(recommendations=value))
+            await session.commit()
+        if result.rowcount == 0:
+            print(f'Подписчика {subscriber_id} нет в таблице')
+
+    async def subscribe_to_recommendations(self, subscriber_id):
+        await self._set_recommendations(subscriber_id, True)
+
+    async def unsubscribe_from_recommendations(self, subscriber_id):
+        await self._set_recommendations(subscriber_id, False)
+
+    async def get_subscriber_by_id(self, subscriber_id):
+        async with AsyncSession(self.engine) as session:
+            result = await session.execute(
+                select(User.__table__).where(User.user_id == subscriber_id))
+            row = result.first()
+        if row is None:
+            print(f'Подписчика {subscriber_id} нет в таблице')
+            return None
+        return dict(row._mapping)
@@ -1,34 +1,154 @@
 # Менеджер управления облаком. В облаке хранятся таблицы с прогнозами цен на акции
 
+import gzip
+import io
+import os
+import typing as tp
+
 import boto3
 import botocore
+import pandas as pd
+from boto3.s3.transfer import TransferConfig
+from s3transfer.manager import TransferManager
 
 import settings
 from storage.singleton import SingletonMeta
 
 
 class CloudManager(metaclass=SingletonMeta):
-    def __init__(self):
-        self.s3_client = boto3.client('s3',
-                                      aws_access_key_id=settings.CLOUDCUBE_ACCESS_KEY_ID,
-                                      aws_secret_access_key=settings.CLOUDCUBE_SECRET_ACCESS_KEY)
+    bucket = 'cloud-cube'
+
+    def __init__(self, s3_client=None, prefix=None):
+        if s3_client is None:
+            s3_client = boto3.client('s3',
+                                     aws_access_key_id=settings.CLOUDCUBE_ACCESS_KEY_ID,
+                                     aws_secret_access_key=settings.CLOUDCUBE_SECRET_ACCESS_KEY)
+        if prefix is None:
+            prefix = settings.CLOUDCUBE_URL[-12:] + '/public/'
+        self.s3_client = s3_client
+        self.prefix = prefix
+
+    def _key(self, filename):
+        return self.prefix + filename
 
     def upload_to_cloud(self, filename):
-        self.s3_client.upload_file(filename, 'cloud-cube',
-                                   settings.CLOUDCUBE_URL[
-                                   -12:] + '/public/' + filename)
+        self.s3_client.upload_file(filename, self.bucket, self._key(filename))
 
     def download_from_cloud(self, filename):
         try:
-            self.s3_client.download_file('cloud-cube',
-                                         settings.CLOUDCUBE_URL[
-                                         -12:] + '/public/' + filename,
+            self.s3_client.download_file(self.bucket, self._key(filename),
                                          filename)
         except botocore.exceptions.ClientError:
             return False
         return True
 
     def delete_from_cloud(self, filename):
-        self.s3_client.delete_object(Bucket='cloud-cube',
-                                     Key=settings.CLOUDCUBE_URL[
-                                         -12:] + '/public/' + filename)
+        self.s3_client.delete_object(Bucket=self.bucket,
+                                     Key=self._key(filename))
+
+    def put_bytes(self, filename, data: bytes, compression=None):
+        """
+        Загрузка данных в облако из памяти, без временного файла на диске
+        """
+        if compression == 'gzip':
+            data = gzip.compress(data)
+        self.s3_client.put_object(Bucket=self.bucket, Key=self._key(filename),
+                                  Body=data)
+
+    def get_bytes(self, filename, compression=None) -> tp.Optional[bytes]:
+        """
+        Получение данных из облака в память. Если файла нет, возвращает None
+        """
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket,
+                                                 Key=self._key(filename))
+        except botocore.exceptions.ClientError:
+            return None
+        data = response['Body'].read()
+        if compression == 'gzip':
+            data = gzip.decompress(data)
+        return data
+
+    @staticmethod
+    def _infer_compression(filename):
+        return 'gzip' if filename.endswith('.gz') else None
+
+    def put_frame(self, frame: pd.DataFrame, filename, **kwargs):
+        """
+        Сохранение таблицы в облако в формате csv. Для файлов
+        с расширением .gz данные сжимаются
+        """
+        data = frame.to_csv(**kwargs).encode('utf-8')
+        self.put_bytes(filename, data, self._infer_compression(filename))
+
+    def get_frame(self, filename, index_col=0, **kwargs) \
+            -> tp.Optional[pd.DataFrame]:
+        """
+        Загрузка таблицы из csv-файла в облаке. Если файла нет,
+        возвращает None
+        """
+        data = self.get_bytes(filename, self._infer_compression(filename))
+        if data is None:
+            return None
+        return pd.read_csv(io.BytesIO(data), index_col=index_col, **kwargs)
+
+    def list_files(self, prefix=''):
+        """
+        Получение отсортированного списка имён файлов, начинающихся с prefix.
+        Список объектов запрашивается постранично (list_objects_v2)
+        """
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        filenames = []
+        for page in paginator.paginate(Bucket=self.bucket,
+                                       Prefix=self._key(prefix)):
+            for item in page.get('Contents', []):
+                filenames.append(item['Key'][len(self.prefix):])
+        return sorted(filenames)
+
+    def latest(self, prefix):
+        """
+        Последний по имени файл с заданным префиксом. Для таблиц вида
+        ordered_ranks_YYYY_MM_DD.csv это самая свежая таблица
+        """
+        filenames = self.list_files(prefix)
+        return filenames[-1] if filenames else None
+
+    def download_many(self, filenames, directory='.', max_concurrency=10):
+        """
+        Параллельная загрузка файлов в каталог directory через пул потоков
+        s3transfer. Возвращает список успешно загруженных файлов
+        """
+        os.makedirs(directory, exist_ok=True)
+        config = TransferConfig(max_concurrency=max_concurrency)
+        with TransferManager(self.s3_client, config) as manager:
+            futures = [(filename, manager.download(
+                self.bucket, self._key(filename),
+                os.path.join(directory, filename)))
+                for filename in filenames]
+
+        downloaded = []
+        for filename, future in futures:
+            try:
+                future.result()
+                downloaded.append(filename)
+            except botocore.exceptions.ClientError:
+                print(f'Не удалось загрузить {filename}')
+        return downloaded
+
+    def delete_many(self, filenames: tp.List[str]):
+        """
+        Удаление файлов пачками по 1000 объектов за запрос.
+        Возвращает список удалённых файлов
+        """
+        deleted = []
+        for start in range(0, len(filenames), 1000):
+            response = self.s3_client.delete_objects(
+                Bucket=self.bucket,
+                Delete={'Objects': [{'Key': self._key(filename)} for filename
+                                    in filenames[start:start + 1000]],
+                        'Quiet': False})
+            for item in response.get('Deleted', []):
+                deleted.append(item['Key'][len(self.prefix):])
+            for error in response.get('Errors', []):
+                print(f'Не удалось удалить {error["Key"]}: {error["Message"]}')
+        return deleted
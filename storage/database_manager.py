@@ -1,27 +1,57 @@
 # Менеджер управления базой данных. В базе хранятся данные о подписчиках
+import io
 import os
+from datetime import time
 
-import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, func, literal, or_
 from sqlalchemy.orm import Session
 
 import settings
-from storage.models import Base, User, ShareInfo
+from storage.models import Base, User, ShareInfo, RankingPublication, \
+    Delivery
+from storage.share_info_cache import ShareInfoCache
 from storage.singleton import SingletonMeta
 
 
 class DatabaseManager(metaclass=SingletonMeta):
+    # соответствие колонок рейтинга и полей таблицы shares_info
+    share_info_columns = {'E/P (%)': 'ep', 'ROE (%)': 'roe',
+                          'Current Price': 'price', 'Rating': 'yahoo_rating',
+                          'Low Target': 'low_target',
+                          'Average Target': 'avg_target',
+                          'High Target': 'high_target'}
+    # время получения рекомендаций для подписчиков, у которых оно не задано
+    # (совпадает со значением по умолчанию в таблице users)
+    default_recommendations_time = time(17, 30)
+
     def __init__(self, engine=None):
-        if engine is None:
-            engine = create_engine(settings.DATABASE_URL)
-        self.engine = engine
+        self._engine = engine
         self.metadata = Base.metadata
+        self.share_info_cache = ShareInfoCache(self._load_share_info)
+
+    @property
+    def engine(self):
+        """
+        Движок базы данных создаётся при первом обращении
+        """
+        if self._engine is None:
+            self._engine = create_engine(settings.DATABASE_URL)
+        return self._engine
 
     def create_all(self):
         self.metadata.create_all(self.engine)
 
+    def create_indexes(self):
+        """
+        Создание индексов, которых ещё нет в существующих таблицах
+        """
+        for table in self.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(self.engine, checkfirst=True)
+
     def drop_all(self):
         self.metadata.drop_all(self.engine)
+        self.share_info_cache.invalidate()
 
     def insert_subscriber(self, subscriber_id, subscriber_name, chat_id,
                           is_subscribe_recommends=True):
@@ -77,6 +107,72 @@ class DatabaseManager(metaclass=SingletonMeta):
             user.pop('_sa_instance_state')
         return users
 
+    def _recommendations_time(self):
+        """
+        Время получения рекомендаций, в котором NULL заменён значением
+        по умолчанию
+        """
+        return func.coalesce(User.recommendations_time,
+                             literal(self.default_recommendations_time,
+                                     User.recommendations_time.type))
+
+    def iter_subscribers(self, chunk_size=1000, start_time=None,
+                         end_time=None, undelivered=None):
+        """
+        Потоковое получение подписчиков рекомендаций. Фильтрация выполняется
+        в базе, читаются только chat_id и user_name, строки загружаются
+        пачками по chunk_size. Интервал [start_time, end_time) ограничивает
+        подписчиков по времени получения рекомендаций. Если задан
+        undelivered, возвращаются только подписчики, которым публикация
+        с этим id ещё не доставлена
+        """
+        with Session(self.engine) as session:
+            query = session.query(User.chat_id, User.user_name).filter(
+                User.recommendations.is_(True))
+            if start_time is not None:
+                query = query.filter(
+                    self._recommendations_time() >= start_time)
+            if end_time is not None:
+                query = query.filter(self._recommendations_time() < end_time)
+            if undelivered is not None:
+                query = query.outerjoin(
+                    Delivery, Delivery.chat_id == User.chat_id).filter(
+                    or_(Delivery.publication_id.is_(None),
+                        Delivery.publication_id < undelivered))
+            query = query.execution_options(stream_results=True)
+            for row in query.yield_per(chunk_size):
+                yield {'chat_id': row.chat_id, 'user_name': row.user_name}
+
+    def mark_delivered(self, chat_ids, publication_id, chunk_size=500):
+        """
+        Запись о доставке публикации publication_id в чаты chat_ids
+        """
+        chat_ids = list(chat_ids)
+        with Session(self.engine) as session:
+            for start in range(0, len(chat_ids), chunk_size):
+                chunk = chat_ids[start:start + chunk_size]
+                session.query(Delivery).filter(
+                    Delivery.chat_id.in_(chunk)).delete(
+                    synchronize_session=False)
+                session.bulk_insert_mappings(
+                    Delivery, [{'chat_id': chat_id,
+                                'publication_id': publication_id}
+                               for chat_id in chunk])
+            session.commit()
+
+    def get_recommendations_times(self):
+        """
+        Получение времён получения рекомендаций и количества подписчиков
+        для каждого из них
+        """
+        recommendations_time = self._recommendations_time()
+        with Session(self.engine) as session:
+            rows = session.query(recommendations_time,
+                                 func.count(User.user_id)) \
+                .filter(User.recommendations.is_(True)) \
+                .group_by(recommendations_time).all()
+        return {row[0]: row[1] for row in rows}
+
     def get_subscriber_by_id(self, subscriber_id):
         with Session(self.engine) as session:
             try:
@@ -88,16 +184,27 @@ class DatabaseManager(metaclass=SingletonMeta):
                 print(f'Подписчика {subscriber_id} нет в таблице')
                 return None
 
+    def _load_share_info(self):
+        """
+        Загрузка всей таблицы shares_info одним запросом
+        """
+        with self.engine.connect() as connection:
+            rows = connection.execute(ShareInfo.__table__.select())
+            return {row.ticker: dict(row._mapping) for row in rows}
+
     def get_share_info(self, ticker):
-        with Session(self.engine) as session:
-            try:
-                share_info = session.query(ShareInfo).filter(
-                    ShareInfo.ticker == ticker).first().__dict__
-                share_info.pop('_sa_instance_state')
-                return share_info
-            except:
-                print(f'Тикера {ticker} нет в таблице')
-                return None
+        share_info = self.share_info_cache.get(ticker)
+        if share_info is None:
+            print(f'Тикера {ticker} нет в таблице')
+        return share_info
+
+    def get_all_share_info(self):
+        return self.share_info_cache.get_all()
+
+    def get_share_prices(self, tickers):
+        share_infos = self.share_info_cache.get_many(tickers)
+        return {ticker: share_info['price']
+                for ticker, share_info in share_infos.items()}
 
     def insert_update_share_info(self, ticker, ep, roe, price, yahoo_rating,
                                  low_target, avg_target, high_target):
@@ -119,8 +226,69 @@ class DatabaseManager(metaclass=SingletonMeta):
                                        low_target, avg_target, high_target)
                 session.add(share_info)
             session.commit()
+        self.share_info_cache.invalidate()
+
+    def bulk_upsert_share_info(self, dataframe, chunk_size=100):
+        """
+        Запись информации обо всех акциях рейтинга одной транзакцией.
+        Используется многострочный INSERT ... ON CONFLICT (ticker) DO UPDATE
+        """
+        table = dataframe[list(self.share_info_columns)].rename(
+            columns=self.share_info_columns)
+        dialect = self.engine.dialect.name
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+            # SQLite хранит NaN как NULL, что нарушает ограничение NOT NULL
+            table = table.fillna({column: ShareInfo.__table__.c[column]
+                                 .default.arg for column in table.columns})
+        else:
+            self._merge_share_info(table, chunk_size)
+            return
+
+        rows = table.to_dict('records')
+        for ticker, row in zip(table.index, rows):
+            row['ticker'] = ticker
+            row['company_name'] = ''
+
+        with self.engine.begin() as connection:
+            for start in range(0, len(rows), chunk_size):
+                statement = insert(ShareInfo.__table__).values(
+                    rows[start:start + chunk_size])
+                statement = statement.on_conflict_do_update(
+                    index_elements=[ShareInfo.ticker],
+                    set_={column: statement.excluded[column]
+                          for column in table.columns})
+                connection.execute(statement)
+        self.share_info_cache.invalidate()
+
+    def _merge_share_info(self, table, chunk_size=100):
+        """
+        Построчное обновление в одной сессии для диалектов без
+        INSERT ... ON CONFLICT. Существующие записи читаются пачками
+        """
+        rows = table.to_dict('records')
+        with Session(self.engine) as session:
+            for start in range(0, len(rows), chunk_size):
+                tickers = table.index[start:start + chunk_size].tolist()
+                existing = {share_info.ticker: share_info for share_info
+                            in session.query(ShareInfo).filter(
+                                ShareInfo.ticker.in_(tickers))}
+                chunk = rows[start:start + chunk_size]
+                for ticker, row in zip(tickers, chunk):
+                    share_info = existing.get(ticker)
+                    if share_info is None:
+                        share_info = ShareInfo(ticker)
+                        session.add(share_info)
+                    for column, value in row.items():
+                        setattr(share_info, column, value)
+            session.commit()
+        self.share_info_cache.invalidate()
 
     def add_companies_names(self):
+        import pandas as pd
+
         white_list = pd.read_excel(os.path.join('resources', 'white_list.xlsx'))
         with Session(self.engine) as session:
             for i, share in white_list.iterrows():
@@ -131,3 +299,55 @@ class DatabaseManager(metaclass=SingletonMeta):
                 if share_info is not None:
                     share_info.company_name = company_name
             session.commit()
+        self.share_info_cache.invalidate()
+
+    @staticmethod
+    def companies_to_json(companies):
+        """
+        Сериализация таблицы компаний для публикации и снимка бота
+        """
+        return companies.to_json(orient='split', double_precision=15)
+
+    @staticmethod
+    def companies_from_json(text):
+        """
+        Восстановление таблицы, записанной companies_to_json. Тикеры
+        и значения читаются как есть, без угадывания типов
+        """
+        import pandas as pd
+
+        return pd.read_json(io.StringIO(text), orient='split', dtype=False,
+                            convert_axes=False, convert_dates=False)
+
+    def publish_ranking(self, ranking_date, best_companies,
+                        prev_best_companies):
+        """
+        Публикация результатов работы анализатора для бота
+        """
+        with Session(self.engine) as session:
+            session.add(RankingPublication(
+                ranking_date, self.companies_to_json(best_companies),
+                self.companies_to_json(prev_best_companies)))
+            session.commit()
+
+    def get_latest_publication(self, after_id=None):
+        """
+        Получение последней публикации анализатора. Если задан after_id,
+        возвращается только публикация новее неё
+        """
+        with Session(self.engine) as session:
+            query = session.query(RankingPublication)
+            if after_id is not None:
+                query = query.filter(RankingPublication.id > after_id)
+            publication = query.order_by(RankingPublication.id.desc()).first()
+            if publication is None:
+                return None
+            return {
+                'id': publication.id,
+                'ranking_date': publication.ranking_date,
+                'created_at': publication.created_at,
+                'best_companies': self.companies_from_json(
+                    publication.best_companies),
+                'prev_best_companies': self.companies_from_json(
+                    publication.prev_best_companies)
+            }
@@ -1,6 +1,7 @@
 # Модели для базы данных
 
-from sqlalchemy import Column, Integer, String, Boolean, Time, Float
+from sqlalchemy import Column, Integer, String, Boolean, Time, Float, Date, \
+    DateTime, Text, func
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -14,7 +15,7 @@ class User(Base):
     chat_id = Column(Integer, nullable=False, unique=True)
     recommendations = Column(Boolean, default=True)
     recommendations_time = Column(Time(timezone=True),
-                                  server_default='17:30:00')
+                                  server_default='17:30:00', index=True)
     is_admin = Column(Boolean, default=False)
 
     def __init__(self, user_id, user_name, chat_id, recommendations):
@@ -49,3 +50,33 @@ class ShareInfo(Base):
         self.avg_target = avg_target
         self.high_target = high_target
         self.company_name = company_name
+
+
+class RankingPublication(Base):
+    __tablename__ = 'ranking_publications'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    ranking_date = Column(Date, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    best_companies = Column(Text, nullable=False)
+    prev_best_companies = Column(Text, nullable=False)
+
+    def __init__(self, ranking_date, best_companies, prev_best_companies):
+        self.ranking_date = ranking_date
+        self.best_companies = best_companies
+        self.prev_best_companies = prev_best_companies
+
+
+class Delivery(Base):
+    """
+    Последняя публикация анализатора, доставленная в чат. По ней рассылка,
+    прерванная перезапуском бота, продолжается с недоставленных чатов
+    """
+    __tablename__ = 'deliveries'
+
+    chat_id = Column(Integer, primary_key=True)
+    publication_id = Column(Integer, nullable=False)
+
+    def __init__(self, chat_id, publication_id):
+        self.chat_id = chat_id
+        self.publication_id = publication_id
@@ -0,0 +1,142 @@
+# Локальный архив рейтингов акций. Рейтинг за каждый день хранится в виде
+# .npy файлов (тикеры и матрица значений), которые читаются отображением
+# в память без копирования. Архив дополняется из облака инкрементально
+
+import json
+import os
+import shutil
+import tempfile
+import typing as tp
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+import settings
+from storage.cloud_manager import CloudManager
+
+
+class RankingArchive:
+    def __init__(self, directory: tp.Optional[str] = None,
+                 cloud_manager: tp.Optional[CloudManager] = None):
+        if directory is None:
+            directory = settings.RANKING_ARCHIVE_PATH
+        self.directory = directory
+        self.cloud_manager = cloud_manager
+        os.makedirs(directory, exist_ok=True)
+        self._index_path = os.path.join(directory, 'index.json')
+        self._dates = self._read_index()
+
+    @staticmethod
+    def _date_key(day: date) -> str:
+        return day.strftime('%Y_%m_%d')
+
+    @staticmethod
+    def get_ranking_filename(day: date) -> str:
+        return 'ordered_ranks_' + day.strftime('%Y_%m_%d') + '.csv'
+
+    def _read_index(self) -> tp.List[date]:
+        if not os.path.exists(self._index_path):
+            return []
+        with open(self._index_path, 'r', encoding='utf-8') as index_file:
+            keys = json.load(index_file)
+        return [datetime.strptime(key, '%Y_%m_%d').date() for key in keys]
+
+    def _write_index(self) -> None:
+        tmp_path = self._index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as index_file:
+            json.dump([self._date_key(day) for day in self._dates],
+                      index_file)
+        os.replace(tmp_path, self._index_path)
+
+    def dates(self) -> tp.List[date]:
+        """
+        Отсортированный список дат, за которые в архиве есть рейтинг
+        """
+        return list(self._dates)
+
+    def put(self, day: date, ranking: pd.DataFrame) -> None:
+        """
+        Сохранение рейтинга за день. Все колонки рейтинга числовые
+        """
+        path = os.path.join(self.directory, self._date_key(day))
+        tmp_path = path + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        np.save(os.path.join(tmp_path, 'tickers.npy'),
+                ranking.index.to_numpy().astype(str))
+        np.save(os.path.join(tmp_path, 'values.npy'),
+                ranking.to_numpy(dtype=float))
+        with open(os.path.join(tmp_path, 'columns.json'), 'w',
+                  encoding='utf-8') as columns_file:
+            json.dump(ranking.columns.tolist(), columns_file)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+        if day not in self._dates:
+            self._dates = sorted(self._dates + [day])
+            self._write_index()
+
+    def get(self, day: date) -> tp.Optional[pd.DataFrame]:
+        """
+        Получение рейтинга за день. Таблица построена поверх отображённых
+        в память массивов и доступна только для чтения
+        """
+        if day not in self._dates:
+            return None
+        path = os.path.join(self.directory, self._date_key(day))
+        tickers = np.load(os.path.join(path, 'tickers.npy'))
+        values = np.load(os.path.join(path, 'values.npy'), mmap_mode='r')
+        with open(os.path.join(path, 'columns.json'), 'r',
+                  encoding='utf-8') as columns_file:
+            columns = json.load(columns_file)
+        return pd.DataFrame(values, index=tickers, columns=columns, copy=False)
+
+    def get_range(self, start: tp.Optional[date] = None,
+                  end: tp.Optional[date] = None) -> tp.Dict[date, pd.DataFrame]:
+        """
+        Получение рейтингов за диапазон дат (границы включительно)
+        """
+        return {day: self.get(day) for day in self._dates
+                if (start is None or day >= start)
+                and (end is None or day <= end)}
+
+    def latest(self, last: tp.Optional[date] = None) \
+            -> tp.Optional[tp.Tuple[date, pd.DataFrame]]:
+        """
+        Последний рейтинг в архиве не позднее даты last
+        """
+        days = [day for day in self._dates if last is None or day <= last]
+        if not days:
+            return None
+        return days[-1], self.get(days[-1])
+
+    def sync(self) -> int:
+        """
+        Загрузка из облака рейтингов, которых ещё нет в архиве. Если архив
+        пуст, загружается только последний рейтинг.
+        Возвращает количество загруженных рейтингов
+        """
+        if self.cloud_manager is None:
+            self.cloud_manager = CloudManager()
+
+        filenames = self.cloud_manager.list_files('ordered_ranks_')
+        if self._dates:
+            last_filename = self.get_ranking_filename(self._dates[-1])
+            filenames = [filename for filename in filenames
+                         if filename > last_filename]
+        else:
+            filenames = filenames[-1:]
+        if not filenames:
+            return 0
+
+        with tempfile.TemporaryDirectory() as directory:
+            downloaded = self.cloud_manager.download_many(filenames, directory)
+            for filename in downloaded:
+                day = datetime.strptime(filename[len('ordered_ranks_'):-4],
+                                        '%Y_%m_%d').date()
+                # тикер NA не должен превращаться в пропуск
+                self.put(day, pd.read_csv(os.path.join(directory, filename),
+                                          index_col=0, keep_default_na=False,
+                                          na_values=['']))
+        return len(downloaded)
@@ -0,0 +1,121 @@
+# Кэш информации об акциях. Таблица shares_info меняется только во время
+# ночного обновления рейтинга, поэтому она целиком хранится в памяти
+# и перечитывается одним запросом после изменения версии или истечения TTL
+
+import threading
+import time
+import typing as tp
+
+
+class ShareInfoCache:
+    def __init__(self, loader: tp.Callable[[], tp.Dict[str, dict]],
+                 ttl: float = 3600.0):
+        self._loader = loader
+        self.ttl = ttl
+        # _lock защищает состояние кэша, _load_lock - чтобы таблицу читал
+        # только один поток, пока остальные ждут или работают со старой
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._rows = None
+        self._loaded_at = 0.0
+        self._loaded_version = -1
+        self._refreshing = False
+        # версия повышается при каждом изменении таблицы и каждом
+        # перечитывании, по ней зависимые кэши понимают, что данные сменились
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self) -> None:
+        """
+        Повышение версии кэша. Таблица будет перечитана при следующем обращении
+        """
+        with self._lock:
+            self.version += 1
+
+    def _is_invalidated(self) -> bool:
+        return self._rows is None or self._loaded_version != self.version
+
+    def _is_expired(self) -> bool:
+        return time.monotonic() - self._loaded_at > self.ttl
+
+    def _load(self) -> tp.Tuple[tp.Dict[str, dict], int]:
+        """
+        Перечитывание таблицы. Запрос к базе выполняется без блокировки
+        состояния, так что читатели не ждут его окончания
+        """
+        with self._load_lock:
+            with self._lock:
+                # таблицу мог уже перечитать другой поток
+                if not self._is_invalidated() and not self._is_expired():
+                    self._refreshing = False
+                    return self._rows, self._loaded_version
+                version = self.version
+            try:
+                rows = self._loader()
+            except Exception:
+                with self._lock:
+                    self._refreshing = False
+                raise
+            with self._lock:
+                self._rows = rows
+                self._loaded_at = time.monotonic()
+                self._refreshing = False
+                if self.version == version:
+                    self.version += 1
+                    self._loaded_version = self.version
+                else:
+                    # таблица изменилась во время чтения, данные уже устарели
+                    self._loaded_version = version
+                return rows, self._loaded_version
+
+    def _refresh_in_background(self) -> None:
+        try:
+            self._load()
+        except Exception as error:
+            print(f'Не удалось перечитать таблицу shares_info: {error}')
+
+    def _get_rows(self, keys: int = 1) -> tp.Tuple[tp.Dict[str, dict], int]:
+        """
+        Получение отображения тикер -> строка таблицы и версии этих данных.
+        После изменения таблицы она перечитывается сразу, а после истечения
+        TTL читатели получают прежние данные, пока таблица перечитывается
+        в фоновом потоке. keys - число запрошенных тикеров для статистики
+        """
+        with self._lock:
+            if not self._is_invalidated():
+                self.hits += keys
+                if self._is_expired() and not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(target=self._refresh_in_background,
+                                     daemon=True).start()
+                return self._rows, self._loaded_version
+            self.misses += keys
+        return self._load()
+
+    def get(self, ticker: str) -> tp.Optional[dict]:
+        row = self._get_rows()[0].get(ticker)
+        return None if row is None else dict(row)
+
+    def get_many(self, tickers: tp.Iterable[str]) -> tp.Dict[str, dict]:
+        tickers = list(tickers)
+        rows = self._get_rows(len(tickers))[0]
+        return {ticker: dict(rows[ticker]) for ticker in tickers
+                if ticker in rows}
+
+    def get_all_with_version(self) -> tp.Tuple[tp.Dict[str, dict], int]:
+        """
+        Вся таблица вместе с версией, которой соответствуют эти данные
+        """
+        with self._lock:
+            keys = len(self._rows) if self._rows is not None else 1
+        rows, version = self._get_rows(keys)
+        return {ticker: dict(row) for ticker, row in rows.items()}, version
+
+    def get_all(self) -> tp.Dict[str, dict]:
+        return self.get_all_with_version()[0]
+
+    @property
+    def stats(self) -> tp.Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses,
+                'version': self.version}
@@ -3,22 +3,21 @@
 import os
 from datetime import date, timedelta
 
-import pandas as pd
-
 from storage import CloudManager
 
 if __name__ == "__main__":
     cloud_manager = CloudManager()
-    start_date = date(2021, 9, 1)
     end_date = date.today()
     weekday = end_date.weekday()
     end_date -= timedelta((weekday > 4) + (weekday > 5) + 1)
-    date_range = pd.date_range(start_date, end_date).strftime(
-        '%Y_%m_%d').tolist()
+    last_filename = 'ordered_ranks_' + end_date.strftime('%Y_%m_%d') + '.csv'
 
-    for i in date_range:
-        filename = 'ordered_ranks_' + i + '.csv'
-        if cloud_manager.download_from_cloud(filename):
-            os.replace(filename, 'backup\\' + filename)
-            print(filename + ' downloaded')
-            cloud_manager.delete_from_cloud(filename)
+    # один запрос на получение списка таблиц и параллельная их загрузка
+    filenames = [filename for filename
+                 in cloud_manager.list_files('ordered_ranks_')
+                 if filename <= last_filename]
+    downloaded = cloud_manager.download_many(filenames,
+                                             os.path.join('backup'))
+    for filename in downloaded:
+        print(filename + ' downloaded')
+    cloud_manager.delete_many(downloaded)
@@ -0,0 +1,86 @@
+# Проверка работы с облаком на S3, подменённом moto
+
+import os
+import tempfile
+import unittest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+import boto3
+import pandas as pd
+
+try:
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+from storage.cloud_manager import CloudManager
+from storage.singleton import SingletonMeta
+
+
+@unittest.skipIf(mock_aws is None, 'moto не установлен')
+class CloudManagerTest(unittest.TestCase):
+    def setUp(self):
+        for name in ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY'):
+            os.environ.setdefault(name, 'testing')
+        self.mock = mock_aws()
+        self.mock.start()
+        s3_client = boto3.client('s3', region_name='us-east-1')
+        s3_client.create_bucket(Bucket=CloudManager.bucket)
+        SingletonMeta._instances.pop(CloudManager, None)
+        self.cloud_manager = CloudManager(s3_client=s3_client,
+                                          prefix='test/public/')
+
+    def tearDown(self):
+        SingletonMeta._instances.pop(CloudManager, None)
+        self.mock.stop()
+
+    def test_bytes_and_frames(self):
+        self.assertIsNone(self.cloud_manager.get_bytes('missing.txt'))
+        self.assertIsNone(self.cloud_manager.get_frame('missing.csv'))
+
+        self.cloud_manager.put_bytes('data.bin', b'abc', compression='gzip')
+        self.assertNotEqual(self.cloud_manager.get_bytes('data.bin'), b'abc')
+        self.assertEqual(
+            self.cloud_manager.get_bytes('data.bin', compression='gzip'),
+            b'abc')
+
+        frame = pd.DataFrame({'Rank': [1.0, None]}, index=['NA', 'A'])
+        self.cloud_manager.put_frame(frame, 'frame.csv.gz')
+        loaded = self.cloud_manager.get_frame(
+            'frame.csv.gz', keep_default_na=False, na_values=[''])
+        pd.testing.assert_frame_equal(loaded, frame)
+
+    def test_list_and_delete_many(self):
+        # больше 1000 объектов - несколько страниц и запросов на удаление
+        filenames = [f'checkpoints/{i:05d}.csv' for i in range(1005)]
+        for filename in filenames:
+            self.cloud_manager.put_bytes(filename, b'')
+        self.cloud_manager.put_bytes('ordered_ranks_2024_03_14.csv', b'')
+        self.cloud_manager.put_bytes('ordered_ranks_2024_03_15.csv', b'')
+
+        self.assertEqual(self.cloud_manager.list_files('checkpoints/'),
+                         filenames)
+        self.assertEqual(self.cloud_manager.latest('ordered_ranks_'),
+                         'ordered_ranks_2024_03_15.csv')
+        self.assertIsNone(self.cloud_manager.latest('missing_'))
+
+        deleted = self.cloud_manager.delete_many(filenames)
+        self.assertEqual(sorted(deleted), filenames)
+        self.assertEqual(self.cloud_manager.list_files(),
+                         ['ordered_ranks_2024_03_14.csv',
+                          'ordered_ranks_2024_03_15.csv'])
+
+    def test_download_many(self):
+        self.cloud_manager.put_bytes('a.csv', b'a')
+        self.cloud_manager.put_bytes('b.csv', b'b')
+        with tempfile.TemporaryDirectory() as directory:
+            downloaded = self.cloud_manager.download_many(
+                ['a.csv', 'missing.csv', 'b.csv'], directory)
+            self.assertEqual(downloaded, ['a.csv', 'b.csv'])
+            with open(os.path.join(directory, 'b.csv'), 'rb') as file:
+                self.assertEqual(file.read(), b'b')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+# Проверка записи информации об акциях в базу на SQLite в памяти
+
+import os
+import unittest
+from datetime import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+from storage.database_manager import DatabaseManager
+from storage.models import User
+from storage.singleton import SingletonMeta
+
+
+class BulkUpsertShareInfoTest(unittest.TestCase):
+    columns = ['E/P (%)', 'ROE (%)', 'Current Price', 'Rating', 'Low Target',
+               'Average Target', 'High Target']
+
+    def setUp(self):
+        SingletonMeta._instances.pop(DatabaseManager, None)
+        self.database_manager = DatabaseManager(
+            engine=create_engine('sqlite://'))
+        self.database_manager.create_all()
+
+    def tearDown(self):
+        SingletonMeta._instances.pop(DatabaseManager, None)
+
+    def make_ranking(self, tickers, value):
+        return pd.DataFrame(np.full((len(tickers), len(self.columns)), value),
+                            index=tickers, columns=self.columns)
+
+    def check_upsert(self, upsert):
+        upsert(self.make_ranking(['A', 'B'], 1.0))
+        ranking = self.make_ranking(['B', 'C'], 2.0)
+        ranking.loc['C', 'Rating'] = np.nan
+        upsert(ranking)
+
+        shares = self.database_manager.get_all_share_info()
+        self.assertEqual(sorted(shares), ['A', 'B', 'C'])
+        self.assertEqual(shares['A']['price'], 1.0)
+        self.assertEqual(shares['B']['price'], 2.0)
+        self.assertEqual(shares['B']['avg_target'], 2.0)
+        # NaN заменяется значением по умолчанию
+        self.assertEqual(shares['C']['yahoo_rating'], 5.0)
+
+    def test_on_conflict_upsert(self):
+        self.check_upsert(self.database_manager.bulk_upsert_share_info)
+
+    def test_merge_fallback(self):
+        def upsert(ranking):
+            table = ranking[list(DatabaseManager.share_info_columns)].rename(
+                columns=DatabaseManager.share_info_columns).fillna(5.0)
+            self.database_manager._merge_share_info(table, chunk_size=1)
+        self.check_upsert(upsert)
+
+    def test_upsert_keeps_company_name(self):
+        self.database_manager.bulk_upsert_share_info(
+            self.make_ranking(['A'], 1.0))
+        self.database_manager.add_companies_names()
+        name = self.database_manager.get_share_info('A')['company_name']
+        self.database_manager.bulk_upsert_share_info(
+            self.make_ranking(['A'], 3.0))
+        self.assertEqual(
+            self.database_manager.get_share_info('A')['company_name'], name)
+
+
+
+class RecommendationsTimeTest(unittest.TestCase):
+    def setUp(self):
+        SingletonMeta._instances.pop(DatabaseManager, None)
+        self.database_manager = DatabaseManager(
+            engine=create_engine('sqlite://'))
+        self.database_manager.create_all()
+        times = {1: time(9, 0), 2: None, 3: time(17, 40)}
+        with self.database_manager.engine.begin() as connection:
+            for user_id, value in times.items():
+                self.database_manager.insert_subscriber(user_id, 'user',
+                                                        user_id)
+                connection.execute(
+                    User.__table__.update()
+                    .where(User.user_id == user_id)
+                    .values(recommendations_time=value))
+
+    def tearDown(self):
+        SingletonMeta._instances.pop(DatabaseManager, None)
+
+    def test_null_time_is_default(self):
+        times = self.database_manager.get_recommendations_times()
+        self.assertEqual(times, {time(9, 0): 1, time(17, 30): 1,
+                                 time(17, 40): 1})
+        chats = [subscriber['chat_id'] for subscriber
+                 in self.database_manager.iter_subscribers(
+                     start_time=time(17, 30), end_time=time(17, 45))]
+        self.assertEqual(sorted(chats), [2, 3])
+        chats = [subscriber['chat_id'] for subscriber
+                 in self.database_manager.iter_subscribers(
+                     end_time=time(17, 30))]
+        self.assertEqual(chats, [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
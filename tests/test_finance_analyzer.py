@@ -0,0 +1,52 @@
+# Проверка обновления предыдущего рейтинга свежими значениями
+
+import os
+import unittest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+import numpy as np
+import pandas as pd
+
+from analyzer.finance_analyzer import Analyzer
+
+
+class UpdateRankingTest(unittest.TestCase):
+    def setUp(self):
+        self.ranking = pd.DataFrame({'E/P rang': [1.0, 2.0, 3.0],
+                                     'ROE rang': [3.0, np.nan, 1.0]},
+                                    index=['A', 'B', 'C'])
+
+    def test_update(self):
+        update = pd.DataFrame({'ROE rang': [5.0, np.nan],
+                               'Rating': [2.5, 1.5]},
+                              index=['B', 'D'])
+        ranking = Analyzer._update_ranking(self.ranking, update)
+
+        # новые тикеры и столбцы добавляются в конец, NaN не затирает
+        # старые значения
+        expected = pd.DataFrame({'E/P rang': [1.0, 2.0, 3.0, np.nan],
+                                 'ROE rang': [3.0, 5.0, 1.0, np.nan],
+                                 'Rating': [np.nan, 2.5, np.nan, 1.5]},
+                                index=['A', 'B', 'C', 'D'])
+        pd.testing.assert_frame_equal(ranking, expected)
+        # исходная таблица не меняется
+        self.assertTrue(np.isnan(self.ranking.loc['B', 'ROE rang']))
+
+    def test_matches_combine_first(self):
+        update = pd.DataFrame({'E/P rang': [7.0, np.nan, 9.0]},
+                              index=['C', 'A', 'E'])
+        ranking = Analyzer._update_ranking(self.ranking, update)
+        pd.testing.assert_frame_equal(
+            ranking,
+            update.combine_first(self.ranking).reindex(
+                index=ranking.index, columns=ranking.columns))
+
+    def test_empty_update(self):
+        update = pd.DataFrame(columns=['E/P rang'], dtype=float)
+        pd.testing.assert_frame_equal(
+            Analyzer._update_ranking(self.ranking, update), self.ranking)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+# Проверка разбора страниц скринера finviz на сохранённой странице
+
+import os
+import re
+import unittest
+
+import numpy as np
+
+from analyzer.finviz_parser import FinvizParser
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'benchmarks', 'fixtures',
+    'finviz_screener_v111.html')
+
+
+def read_fixture():
+    with open(FIXTURE, encoding='utf-8') as fixture:
+        return fixture.read()
+
+
+def replace_column(html, param, value):
+    """
+    Замена значения столбца param во всех строках таблицы
+    """
+    def replace_row(match):
+        cells = re.split(r'(?=<td)', match.group(0))
+        # cells[0] - открывающий тег строки
+        cell = cells[param + 1]
+        cells[param + 1] = re.sub(r'>[^<>]*</a>', f'>{value}</a>', cell)
+        return ''.join(cells)
+    return re.sub(r'<tr valign="top".*?</tr>', replace_row, html, flags=re.S)
+
+
+class FinvizParserTest(unittest.TestCase):
+    def setUp(self):
+        self.parser = FinvizParser()
+        self.html = read_fixture()
+
+    def test_parse(self):
+        tickers, ranks, values = self.parser.parse(self.html, (7, 8))
+        self.assertEqual(len(tickers), 20)
+        self.assertEqual(tickers[0], 'A')
+        self.assertEqual(ranks.tolist(), list(range(1, 21)))
+        self.assertEqual(values.shape, (20, 2))
+        self.assertTrue(np.isfinite(values[:, 1]).all())
+
+    def test_all_missing_column(self):
+        html = replace_column(self.html, 7, '-')
+        tickers, ranks, values = self.parser.parse(html, (7, 8))
+        self.assertEqual(len(tickers), 20)
+        self.assertTrue(np.isnan(values[:, 0]).all())
+        self.assertTrue(np.isfinite(values[:, 1]).all())
+
+    def test_page_without_rows(self):
+        html = self.html.split('<tr valign="top"')[0] + '</table>'
+        tickers, ranks, values = self.parser.parse(html, (7,))
+        self.assertEqual(tickers, [])
+        self.assertEqual(values.shape, (0, 1))
+
+    def test_page_without_table(self):
+        with self.assertRaises(ValueError):
+            self.parser.parse('<html><body>Error</body></html>', (7,))
+
+    def test_to_float(self):
+        values = FinvizParser._to_float(['12.5%', '1,234.56', '-', '', '7'])
+        np.testing.assert_array_equal(
+            values, [12.5, 1234.56, np.nan, np.nan, 7.0])
+        self.assertTrue(np.isnan(FinvizParser._to_float(['-', '-'])).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
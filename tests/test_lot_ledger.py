@@ -0,0 +1,78 @@
+# Проверка журнала лотов: закрытие лотов по FIFO и чтение старых таблиц
+
+import unittest
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from assets.lot_ledger import LotLedger
+
+
+class LotLedgerTest(unittest.TestCase):
+    def setUp(self):
+        self.ledger = LotLedger(capacity=2)
+        self.ledger.buy('A', 10, 1.0, date(2024, 1, 1))
+        self.ledger.buy('A', 5, 2.0, date(2024, 1, 2))
+        self.ledger.buy('B', 3, 7.0, date(2024, 1, 3))
+
+    def test_sell_splits_lot(self):
+        self.assertTrue(self.ledger.sell('A', 12, 3.0, date(2024, 2, 1)))
+        self.assertEqual(self.ledger.get_shares_dict(), {'A': 3, 'B': 3})
+        self.assertEqual(self.ledger.last_open_prices(), {'A': 2.0, 'B': 7.0})
+
+        frame = self.ledger.to_frame()
+        closed = frame[frame['is_closed']]
+        # первый лот закрыт целиком, от второго продано 2 акции из 5
+        self.assertEqual(closed['number'].tolist(), [10, 2])
+        self.assertEqual(closed['open_price'].tolist(), [1.0, 2.0])
+        self.assertTrue((closed['close_price'] == 3.0).all())
+        self.assertTrue((closed['close_date'] ==
+                         pd.Timestamp(2024, 2, 1)).all())
+        opened = frame[~frame['is_closed']]
+        self.assertEqual(opened['number'].tolist(), [3, 3])
+        self.assertTrue(opened['close_price'].isna().all())
+
+    def test_sell_more_than_open(self):
+        self.assertFalse(self.ledger.sell('A', 16, 3.0, date(2024, 2, 1)))
+        self.assertFalse(self.ledger.sell('C', 1, 3.0, date(2024, 2, 1)))
+        self.assertEqual(self.ledger.get_shares_dict(), {'A': 15, 'B': 3})
+
+    def test_sell_everything(self):
+        self.assertTrue(self.ledger.sell('B', 3, 8.0, date(2024, 2, 1)))
+        self.assertEqual(self.ledger.get_shares_dict(), {'A': 15})
+        self.assertEqual(self.ledger.open_number('B'), 0)
+
+    def test_round_trip(self):
+        self.ledger.sell('A', 12, 3.0, date(2024, 2, 1))
+        ledger = LotLedger.from_frame(self.ledger.to_frame())
+        # при чтении лоты упорядочиваются по дате открытия
+        expected = self.ledger.to_frame().sort_values(
+            by='open_date', kind='mergesort').reset_index(drop=True)
+        pd.testing.assert_frame_equal(ledger.to_frame(), expected)
+        self.assertTrue(ledger.sell('A', 3, 4.0, date(2024, 3, 1)))
+        self.assertEqual(ledger.get_shares_dict(), {'B': 3})
+
+    def test_from_frame_legacy_columns(self):
+        table = pd.DataFrame({
+            'ticker': ['A', 'A', 'B'],
+            'number': [4, 6, 2],
+            'open_price': [1.0, 1.5, 5.0],
+            'closed_price': [2.0, np.nan, np.nan],
+            'open_date': ['2024-01-01', '2024-01-02', '2023-12-31'],
+            'closed_date': ['2024-01-05', None, None],
+            'is_closed': [True, False, False]})
+        ledger = LotLedger.from_frame(table)
+
+        frame = ledger.to_frame()
+        self.assertEqual(list(frame.columns), LotLedger.columns)
+        # лоты упорядочиваются по дате открытия
+        self.assertEqual(frame['ticker'].tolist(), ['B', 'A', 'A'])
+        closed = frame[frame['is_closed']].iloc[0]
+        self.assertEqual(closed['close_price'], 2.0)
+        self.assertEqual(closed['close_date'], pd.Timestamp(2024, 1, 5))
+        self.assertEqual(ledger.get_shares_dict(), {'B': 2, 'A': 6})
+
+
+if __name__ == '__main__':
+    unittest.main()
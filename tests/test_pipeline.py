@@ -0,0 +1,178 @@
+# Проверка продолжения формирования рейтинга по контрольным точкам в облаке
+
+import json
+import os
+import unittest
+from datetime import date
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+import numpy as np
+import pandas as pd
+
+from analyzer.pipeline import RankingPipeline
+from benchmarks.fakes import MemoryS3Client
+from storage.cloud_manager import CloudManager
+from storage.singleton import SingletonMeta
+
+DAY = date(2024, 3, 15)
+STARTED = 1710500000.0
+
+
+class FakeYahooFetcher:
+    empty_column = 'No Data'
+    budget = 60.0
+
+
+class FakeRankingArchive:
+    def __init__(self):
+        self.rankings = dict()
+
+    def put(self, day, ranking):
+        self.rankings[day] = ranking
+
+    @staticmethod
+    def get_ranking_filename(day):
+        return f'ordered_ranks_{day:%Y_%m_%d}.csv'
+
+
+class FakeAnalyzer:
+    """
+    Этапы Analyzer, которые отдают небольшие таблицы и запоминают вызовы
+    """
+    def __init__(self, cloud_manager, fail_roe=False):
+        self.cloud_manager = cloud_manager
+        self.fail_roe = fail_roe
+        self.ranking_state = None
+        self.yahoo_fetcher = FakeYahooFetcher()
+        self.ranking_archive = FakeRankingArchive()
+        self.calls = []
+        self.estimated = []
+
+    def _get_pe_ranks(self):
+        self.calls.append('pe')
+        return pd.DataFrame({'E/P rang': [1.0, 2.0, 3.0]},
+                            index=['A', 'B', 'NA'])
+
+    def _get_roe_ranks(self):
+        self.calls.append('roe')
+        if self.fail_roe:
+            raise ConnectionError('finviz недоступен')
+        return pd.DataFrame({'ROE rang': [3.0, 2.0, 1.0]},
+                            index=['A', 'B', 'NA'])
+
+    @staticmethod
+    def _need_roe_ranks(started):
+        return True
+
+    def _get_new_ranking(self, pe_ranks, roe_ranks):
+        self.calls.append('merge')
+        ranking = pe_ranks.join(roe_ranks)
+        ranking['Summary rang'] = ranking['E/P rang'] + ranking['ROE rang']
+        return ranking
+
+    @staticmethod
+    def _get_estimation_tickers(ranking, now):
+        return ranking.index.to_list()
+
+    def _get_estimation(self, tickers, budget=None):
+        self.estimated.extend(tickers)
+        return pd.DataFrame({'Rating': [2.0] * len(tickers),
+                             'No Data': [0.0] * len(tickers)},
+                            index=tickers, dtype=float)
+
+    @staticmethod
+    def _apply_estimation(ranking, estimation):
+        return ranking.join(estimation[['Rating']])
+
+    def _save_info_to_database(self, ranking):
+        self.calls.append('database')
+
+    def _update_ranking_state(self, pe_ranks, roe_ranks, estimation, now):
+        self.calls.append(('state', now))
+
+
+class RankingPipelineTest(unittest.TestCase):
+    def setUp(self):
+        SingletonMeta._instances.pop(CloudManager, None)
+        self.cloud_manager = CloudManager(s3_client=MemoryS3Client(),
+                                          prefix='test/')
+        self.prefix = f'checkpoints/{DAY.isoformat()}/'
+
+    def tearDown(self):
+        SingletonMeta._instances.pop(CloudManager, None)
+
+    def put_manifest(self, completed):
+        self.cloud_manager.put_bytes(
+            self.prefix + 'manifest.json',
+            json.dumps({'day': DAY.isoformat(), 'started': STARTED,
+                        'completed': completed}).encode())
+
+    def test_resume_from_partial_manifest(self):
+        analyzer = FakeAnalyzer(self.cloud_manager)
+        self.put_manifest(['finviz_pe', 'finviz_roe', 'merge'])
+        self.cloud_manager.put_frame(analyzer._get_pe_ranks(),
+                                     self.prefix + 'finviz_pe.csv.gz')
+        self.cloud_manager.put_frame(analyzer._get_roe_ranks(),
+                                     self.prefix + 'finviz_roe.csv.gz')
+        ranking = analyzer._get_new_ranking(analyzer._get_pe_ranks(),
+                                            analyzer._get_roe_ranks())
+        self.cloud_manager.put_frame(ranking, self.prefix + 'merge.csv.gz')
+        # прогнозы по A уже загружены, B загрузить не удалось
+        self.cloud_manager.put_frame(
+            pd.DataFrame({'Rating': [1.5, np.nan],
+                          'No Data': [0.0, np.nan]}, index=['A', 'B']),
+            self.prefix + 'yahoo_part_00000.csv.gz')
+        analyzer.calls.clear()
+
+        result = RankingPipeline(analyzer, DAY).run()
+
+        self.assertNotIn('pe', analyzer.calls)
+        self.assertNotIn('roe', analyzer.calls)
+        self.assertNotIn('merge', analyzer.calls)
+        self.assertEqual(analyzer.estimated, ['B', 'NA'])
+        self.assertEqual(result['Rating'].to_dict(),
+                         {'A': 1.5, 'B': 2.0, 'NA': 2.0})
+        self.assertIs(analyzer.ranking_archive.rankings[DAY], result)
+        # отметки о загрузке датируются началом прерванного запуска
+        self.assertIn(('state', STARTED), analyzer.calls)
+        self.assertEqual(self.cloud_manager.list_files('checkpoints/'), [])
+        self.assertEqual(self.cloud_manager.list_files('ordered_ranks_'),
+                         ['ordered_ranks_2024_03_15.csv'])
+
+    def test_failed_pass_keeps_finished_one(self):
+        analyzer = FakeAnalyzer(self.cloud_manager, fail_roe=True)
+        with self.assertRaises(ConnectionError):
+            RankingPipeline(analyzer, DAY).run()
+        manifest = json.loads(self.cloud_manager.get_bytes(
+            self.prefix + 'manifest.json'))
+        self.assertEqual(manifest['completed'], ['finviz_pe'])
+
+        analyzer = FakeAnalyzer(self.cloud_manager)
+        result = RankingPipeline(analyzer, DAY).run()
+        self.assertEqual(analyzer.calls[:2], ['roe', 'merge'])
+        self.assertEqual(sorted(result.index), ['A', 'B', 'NA'])
+
+    def test_find_unfinished(self):
+        self.assertIsNone(RankingPipeline.find_unfinished(
+            self.cloud_manager, date(2024, 3, 1)))
+        self.put_manifest(['finviz_pe'])
+        self.assertEqual(RankingPipeline.find_unfinished(
+            self.cloud_manager, date(2024, 3, 15)), DAY)
+        # запуск за прошедший день не продолжается
+        self.assertIsNone(RankingPipeline.find_unfinished(
+            self.cloud_manager, date(2024, 3, 18)))
+
+    def test_last_weekday(self):
+        self.assertEqual(RankingPipeline.last_weekday(date(2024, 3, 15)),
+                         date(2024, 3, 15))
+        self.assertEqual(RankingPipeline.last_weekday(date(2024, 3, 16)),
+                         date(2024, 3, 15))
+        self.assertEqual(RankingPipeline.last_weekday(date(2024, 3, 17)),
+                         date(2024, 3, 15))
+        self.assertEqual(RankingPipeline.last_weekday(date(2024, 3, 18)),
+                         date(2024, 3, 18))
+
+
+if __name__ == '__main__':
+    unittest.main()
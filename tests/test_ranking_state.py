@@ -0,0 +1,86 @@
+# Проверка определения устаревших показателей для инкрементального
+# обновления рейтинга
+
+import os
+import unittest
+import zlib
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+import numpy as np
+import pandas as pd
+
+from analyzer.ranking_state import DAY, RankingState
+from benchmarks.fakes import MemoryS3Client
+from storage.cloud_manager import CloudManager
+from storage.singleton import SingletonMeta
+
+NOW = 1700000000.0
+
+
+class RankingStateTest(unittest.TestCase):
+    def setUp(self):
+        SingletonMeta._instances.pop(CloudManager, None)
+        self.cloud_manager = CloudManager(s3_client=MemoryS3Client(),
+                                          prefix='test/')
+        self.state = RankingState(self.cloud_manager)
+
+    def tearDown(self):
+        SingletonMeta._instances.pop(CloudManager, None)
+
+    def test_unknown_tickers_are_stale(self):
+        self.assertTrue(self.state.stale_fundamentals(['A', 'B'], NOW).all())
+        self.assertEqual(self.state.stale_targets(['A', 'B'], NOW),
+                         ['A', 'B'])
+
+    def test_fundamentals_age(self):
+        self.state.mark_fundamentals(['A'], NOW - 29 * DAY)
+        self.state.mark_fundamentals(['B'], NOW - 31 * DAY)
+        self.assertEqual(
+            self.state.stale_fundamentals(['A', 'B'], NOW).tolist(),
+            [False, True])
+
+    def test_new_report_makes_values_stale(self):
+        self.state.mark_fundamentals(['A', 'B'], NOW - DAY)
+        # у A отчётность вышла после загрузки, у B ещё не вышла
+        self.state.mark_targets(pd.Series([NOW - 3600, NOW + DAY],
+                                          index=['A', 'B']), NOW - DAY)
+        self.assertEqual(
+            self.state.stale_fundamentals(['A', 'B'], NOW).tolist(),
+            [True, False])
+        self.assertEqual(self.state.stale_targets(['A', 'B'], NOW), ['A'])
+
+    def test_targets_age_is_spread(self):
+        tickers = ['A', 'B', 'C', 'D']
+        self.state.mark_targets(pd.Series(np.nan, index=tickers),
+                                NOW - 5 * DAY)
+        # срок жизни прогноза каждого тикера - от 3.5 до 7 дней
+        spread = np.array([zlib.crc32(ticker.encode()) / 2 ** 32
+                           for ticker in tickers])
+        expected = [ticker for ticker, value in zip(tickers, spread)
+                    if 5 > 7 * (0.5 + 0.5 * value)]
+        self.assertEqual(self.state.stale_targets(tickers, NOW), expected)
+        self.assertEqual(self.state.stale_targets(tickers, NOW - 1.5 * DAY),
+                         [])
+        self.assertEqual(self.state.stale_targets(tickers, NOW + 2.1 * DAY),
+                         tickers)
+
+    def test_empty_targets_wait(self):
+        self.state.mark_empty_targets(['A'], NOW - DAY)
+        self.state.mark_empty_targets(['B'], NOW - 4 * DAY)
+        self.assertEqual(self.state.stale_targets(['A', 'B'], NOW), ['B'])
+
+    def test_save_and_load(self):
+        self.state.mark_prices(['NA', 'A'], NOW)
+        self.state.mark_fundamentals(['NA'], NOW)
+        self.state.save()
+
+        state = RankingState(self.cloud_manager)
+        state.load()
+        self.assertEqual(sorted(state.frame.index), ['A', 'NA'])
+        self.assertEqual(state.stale_fundamentals(['NA', 'A'], NOW).tolist(),
+                         [False, True])
+
+
+if __name__ == '__main__':
+    unittest.main()